@@ -1,10 +1,24 @@
 # This is a manual translation, from perl to python, of :
 # http://cpansearch.perl.org/src/GSULLIVAN/Verilog-VCD-0.03/lib/Verilog/VCD.pm 
 
+import os
 import re
+import sys
+import gzip
+import lzma
+import queue
+import bisect
+import pickle
+import hashlib
+import threading
+import collections
+import time as _time
+from array import array
 
-global timescale
-global endtime
+# timescale and end time of the last parsed file (see get_timescale and
+#   get_endtime); timescale stays None for a file without $timescale
+timescale = None
+endtime = None
 
 
 # our local exception for VCD parsing errors (inherited from Exception)
@@ -12,11 +26,11 @@ class VCDParseError(Exception):
     pass
 
 
-def list_sigs(file):
+def list_sigs(file, use_index=0):
     """Parse input VCD file into data structure, 
     then return just a list of the signal names."""
 
-    vcd = parse_vcd(file, only_sigs=1)
+    vcd = parse_vcd(file, only_sigs=1, use_index=use_index)
 
     sigs = []
     for k in vcd.keys():
@@ -27,138 +41,1078 @@ def list_sigs(file):
     return sigs
 
 
-def parse_vcd(file, only_sigs=0, use_stdout=0, siglist=[], opt_timescale=''):
+def parse_vcd(file, only_sigs=0, use_stdout=0, siglist=[], opt_timescale='',
+              compact=0, use_index=0, start=None, end=None, last=None,
+              select=None, follow=None, counts=None):
     """Parse input VCD file into data structure.
-    Also, print t-v pairs to STDOUT, if requested."""
+    Also, print t-v pairs to STDOUT, if requested.
+    With select, a select(hier, name) predicate chooses the nets instead
+    of siglist, as each $var is parsed.
+    With compact, each code maps to a Waveform record instead of a dict.
+    With use_index, the header is taken from (or saved to) a header index.
+    With start/end (or the last N time steps), only that time window is
+    returned, seeking to it through the time index.
+    With follow (a Follow), the file may still be being written; parsing
+    waits for new data until it is finished.
+    With counts (a dict), the lines and bytes read while parsing are added
+    to its 'lines' and 'bytes' entries."""
 
-    global endtime
+    global endtime, timescale
+    timescale = None
+
+    if last is not None and last < 1:
+        raise VCDParseError("Error: last must be at least 1, not "+\
+                str(last)+".")
 
     usigs = {}
     for i in siglist:
         usigs[i] = 1
 
-    if len(usigs):
+    if len(usigs) or select is not None:
         all_sigs = 0
     else:
         all_sigs = 1
 
     data = {}
-    mult = 0
+    mult = _timescale_mult(None)
     num_sigs = 0
     hier = []
     time = 0
 
-    with open(file, 'r') as fh:
+    # a compressed or followed file is read as a stream and cannot be
+    #   seeked, so it has no header or time index
+    if use_index and (follow is not None or vcd_compression(file) is not None):
+        use_index = 0
+
+    index = load_header_index(file) if use_index else None
+    if index is not None:
+        return _parse_indexed(file, index, only_sigs, use_stdout, usigs,
+                              all_sigs, opt_timescale, compact,
+                              (start, end, last), select, counts)
+
+    # all nets, and whether the header held no value changes, for the index
+    index_nets = {}
+    index_clean = 1
+    statement = None
+
+    with open_vcd(file, follow) as fh:
+        if counts is not None:
+            fh = _CountingReader(fh, counts)
+        # The header ($scope/$var/...) is parsed line by line; the
+        # value-change body is handed over to _parse_body once
+        # $enddefinitions has been seen.
         while True:
             line = fh.readline()
-            if line == '': # EOF
-                break
+            if line == b'': # EOF
+                return data
 
             # chomp
             # s/ ^ \s+ //x
-            line = line.strip()
+            line = line.decode('ascii', 'replace').strip()
 
             # if nothing left after we strip whitespace, go to next line
             if line == '':
                 continue
 
-            # put most frequent lines encountered at start of if/elif, so other
-            #   clauses usually don't need to be tested 
+            # $var lines make up most of the header, so they are tested
+            #   right after the value-change and time lines
             if line[0] in ('b', 'B', 'r', 'R'):
                 (value,code) = line[1:].split()
+                index_clean = 0
                 if (code in data):
                     if (use_stdout):
                         print( time, value )
                     else:
-                        if 'tv' not in data[code]:
-                            data[code]['tv'] = []
-                        data[code]['tv'].append( (time, value) )
-        
+                        data[code].setdefault('tv', []).append( (time, value) )
+
             elif line[0] in ('0', '1', 'x', 'X', 'z', 'Z'):
                 value = line[0]
                 code = line[1:]
+                index_clean = 0
                 if (code in data):
                     if (use_stdout):
                         print( time, value )
                     else:
-                        if 'tv' not in data[code]:
-                            data[code]['tv'] = []
-                        data[code]['tv'].append( (time, value) )
-        
+                        data[code].setdefault('tv', []).append( (time, value) )
+
             elif line[0]=='#':
                 time = mult * int(line[1:])
                 endtime = time
+                index_clean = 0
+
+            elif "$var" in line:
+                # assumes all on one line:
+                #   $var reg 1 *@ data $end
+                #   $var wire 4 ) addr [3:0] $end
+                ls = line.split()
+                type = ls[1]
+                size = ls[2]
+                code = ls[3]
+                name = "".join(ls[4:-1])
+                path = '.'.join(hier)
+                full_name = path + '.' + name
+                if use_index:
+                    # tuples with shared strings keep the pickle small
+                    nets = index_nets.setdefault(code, [])
+                    net = (sys.intern(type), name, sys.intern(size), sys.intern(path))
+                    if net not in nets:
+                        nets.append(net)
+                if select is not None:
+                    selected = select(path, name)
+                else:
+                    selected = (full_name in usigs) or all_sigs
+                if selected:
+                  if code not in data:
+                      data[code] = {}
+                  if 'nets' not in data[code]:
+                      data[code]['nets'] = []
+                  var_struct = {
+                      'type' : type,
+                      'name' : name,
+                      'size' : size,
+                      'hier' : path,
+                   } 
+                  if var_struct not in data[code]['nets']:
+                      data[code]['nets'].append( var_struct )
 
             elif "$enddefinitions" in line:
+                if use_index and index_clean:
+                    save_header_index(file, index_nets, statement, fh.tell())
+
                 num_sigs = len(data)
                 if (num_sigs == 0):
                     if (all_sigs):
                         VCDParseError("Error: No signals were found in the "\
                                 "VCD file "+file+". Check the VCD file for "\
                                 "proper var syntax.")
-                    
+
                     else:
                         VCDParseError("Error: No matching signals were found "\
                                 "in the VCD file "+file+". Use list_sigs to "\
                                 "view all signals in the VCD file.")
-                
+
                 if ((num_sigs>1) and use_stdout):
                     VCDParseError("Error: There are too many signals "\
                             "(num_sigs) for output to STDOUT.  Use list_sigs "\
                             "to select a single signal.")
-                
+
+                if compact:
+                    data = _compact_data(data)
+
                 if only_sigs:
-                    break
+                    return data
+                break
 
             elif "$timescale" in line:
                 statement = line
                 if not "$end" in line:
-                    while fh:
-                        line = fh.readline()
-                        statement += line
-                        if "$end" in line:
+                    while True:
+                        line = fh.readline().decode('ascii', 'replace')
+                        statement += ' ' + line
+                        if line == '' or "$end" in line:
                             break
-                
+
                 mult = calc_mult(statement, opt_timescale)
 
             elif "$scope" in line:
                 # assumes all on one line
                 #   $scope module dff end
                 hier.append( line.split()[2] ) # just keep scope name
-            
+
             elif "$upscope" in line:
                 hier.pop()
-            
-            elif "$var" in line:
-                # assumes all on one line:
-                #   $var reg 1 *@ data $end
-                #   $var wire 4 ) addr [3:0] $end
-                ls = line.split()
-                type = ls[1]
-                size = ls[2]
-                code = ls[3]
-                name = "".join(ls[4:-1])
-                path = '.'.join(hier)
-                full_name = path + '.' + name
-                if (full_name in usigs) or all_sigs:
-                  if code not in data:
-                      data[code] = {}
-                  if 'nets' not in data[code]:
-                      data[code]['nets'] = []
-                  var_struct = {
-                      'type' : type,
-                      'name' : name,
-                      'size' : size,
-                      'hier' : path,
-                   } 
-                  if var_struct not in data[code]['nets']:
-                      data[code]['nets'].append( var_struct )
 
-    fh.close()
+        _parse_window(file, fh, data, time, mult, use_stdout, compact,
+                      start, end, last)
 
     return data
 
 
+# Bumped whenever the layout of the header or time index changes.
+INDEX_VERSION = 2
+
+# Directory for header indexes.  When empty, the index is a sidecar file
+# next to the VCD file (<file>.idx).
+INDEX_DIR = os.environ.get('VCD_INDEX_DIR', '')
+
+
+def _index_path(file, suffix='.idx'):
+    if INDEX_DIR:
+        digest = hashlib.sha1(os.path.abspath(file).encode()).hexdigest()
+        return os.path.join(INDEX_DIR, digest + suffix)
+    return file + suffix
+
+
+def _index_key(file):
+    st = os.stat(file)
+    return (os.path.abspath(file), st.st_size, st.st_mtime_ns)
+
+
+def _load_index(file, suffix):
+    try:
+        with open(_index_path(file, suffix), 'rb') as fh:
+            index = pickle.load(fh)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if (not isinstance(index, dict) or index.get('version') != INDEX_VERSION
+            or index.get('key') != _index_key(file)):
+        return None
+    return index
+
+
+def _save_index(file, suffix, index):
+    index['version'] = INDEX_VERSION
+    index['key'] = _index_key(file)
+    path = _index_path(file, suffix)
+    try:
+        if INDEX_DIR:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+        with open(path + '.tmp', 'wb') as fh:
+            pickle.dump(index, fh, pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+
+def load_header_index(file):
+    """Return the header index of a VCD file, or None if there is no
+    index or it is stale (the file path, size or mtime changed)."""
+
+    return _load_index(file, '.idx')
+
+
+def save_header_index(file, nets, statement, offset):
+    """Save the header index of a VCD file: the nets of every identifier
+    code as (type, name, size, hier) tuples, the $timescale statement and
+    the byte offset just past $enddefinitions.  Failing to write the index
+    is not an error."""
+
+    _save_index(file, '.idx', {
+        'nets'      : nets,
+        'timescale' : statement,
+        'offset'    : offset,
+    })
+
+
+def _parse_indexed(file, index, only_sigs, use_stdout, usigs, all_sigs,
+                   opt_timescale, compact, window, select=None, counts=None):
+    """parse_vcd using a header index: select the nets from the index,
+    then seek straight to the value-change section."""
+
+    data = {}
+    for code, nets in index['nets'].items():
+        selected = [{'type': t, 'name': n, 'size': s, 'hier': h}
+                    for (t, n, s, h) in nets
+                    if (select(h, n) if select is not None
+                        else all_sigs or (h + '.' + n) in usigs)]
+        if selected:
+            data[code] = {'nets': selected}
+
+    mult = _timescale_mult(index['timescale'], opt_timescale)
+
+    if compact:
+        data = _compact_data(data)
+    if only_sigs:
+        return data
+
+    with open(file, 'rb') as fh:
+        fh.seek(index['offset'])
+        if counts is not None:
+            fh = _CountingReader(fh, counts)
+        _parse_window(file, fh, data, 0, mult, use_stdout, compact, *window)
+
+    return data
+
+
+# Number of time steps between two state checkpoints of the time index.
+TIME_INDEX_EVERY = 256
+
+
+def load_time_index(file):
+    """Return the time index of a VCD file, or None if there is no index
+    or it is stale."""
+
+    return _load_index(file, '.tidx')
+
+
+def build_time_index(file, every=TIME_INDEX_EVERY):
+    """Scan the value-change section of a VCD file and save its time index
+    (<file>.tidx, or under VCD_INDEX_DIR), then return it.
+
+    The index holds the raw time and byte offset of every #time line in
+    'times' and 'offsets' (array('q')), and, every `every` time steps, a
+    checkpoint (step, {code: value}) with the last value of every code
+    that changed since the previous checkpoint.  Only changed codes are
+    stored, so the index grows with the value changes of the file and not
+    with signals x steps; the state before a step is the merge of all
+    checkpoints up to it (see _checkpoint_state)."""
+
+    times = array('q')
+    offsets = array('q')
+    checkpoints = []
+    changed = {}
+
+    with open(file, 'rb') as fh:
+        _skip_header(fh)
+        pos = fh.tell()
+        for line in fh:
+            tokens = line.split()
+            if tokens:
+                c = tokens[0][0]
+                if c == 0x23: # '#'
+                    if len(times) % every == 0:
+                        checkpoints.append( (len(times), changed) )
+                        changed = {}
+                    times.append(int(tokens[0][1:]))
+                    offsets.append(pos)
+                elif c in _VECTOR_PREFIXES:
+                    changed[tokens[1].decode('ascii')] = tokens[0][1:].decode('ascii')
+                else:
+                    for tok in tokens:
+                        if tok[0] in _SCALAR_VALUES:
+                            changed[tok[1:].decode('ascii')] = _SCALAR_VALUES[tok[0]]
+            pos += len(line)
+
+    index = {
+        'times'       : times,
+        'offsets'     : offsets,
+        'checkpoints' : checkpoints,
+    }
+    _save_index(file, '.tidx', index)
+    return index
+
+
+def _checkpoint_state(checkpoints, step, codes):
+    """Return (checkpoint step, {code: value}) for the last checkpoint at
+    or before step, with the values of the given codes just before it,
+    merged from the changes stored in that checkpoint and the ones before
+    it; (None, None) if there is none."""
+
+    state = {}
+    found = None
+    for cp_step, changed in checkpoints:
+        if cp_step > step:
+            break
+        found = cp_step
+        for code, value in changed.items():
+            if code in codes:
+                state[code] = value
+    if found is None:
+        return None, None
+    return found, state
+
+
+def _parse_window(file, fh, data, time, mult, use_stdout, compact,
+                  start=None, end=None, last=None):
+    """Parse the value-change section of fh into data, limited to the
+    time window [start, end].
+
+    When the window does not begin at the start of the file, the time
+    index is used to seek to the nearest checkpoint at or before start,
+    the selected codes are seeded with the checkpoint state, and every
+    tv list is then cut so that it begins with the value held at start."""
+
+    if start is None and last is None:
+        _parse_body(fh, data, time, mult, use_stdout, compact, end)
+        return
+
+    if not fh.seekable():
+        # a compressed stream has no time index: it is parsed from the
+        #   beginning instead, and the tv lists are cut at start below;
+        #   for last, the last times of the whole stream are kept while
+        #   parsing and the first of them is the start
+        if last is not None:
+            steps = collections.deque(maxlen=last)
+            _parse_body(fh, data, time, mult, use_stdout, compact, end, steps)
+            if not steps:
+                return
+            start = steps[0]
+            _trim_window(data, use_stdout, compact, start)
+            return
+    else:
+        tindex = load_time_index(file) or build_time_index(file)
+        times = tindex['times']
+        if last is not None:
+            if not times:
+                _parse_body(fh, data, time, mult, use_stdout, compact, end)
+                return
+            start = mult * times[max(len(times) - last, 0)]
+
+        # first time step at or after start, and the checkpoint before it
+        #   (times are raw, so start is scaled down instead)
+        step = bisect.bisect_left(times, start / mult)
+        cp_step, state = _checkpoint_state(tindex['checkpoints'], step, data)
+
+        if cp_step is not None and cp_step < len(times):
+            # the checkpoint holds the values just before its step; when
+            #   that step is the first one after start, they are the values
+            #   held at start and are stamped there
+            time = min(mult * times[cp_step], start)
+            fh.seek(tindex['offsets'][cp_step])
+            for code, d in data.items():
+                if code in state:
+                    if use_stdout:
+                        continue
+                    tv = d if compact else d.setdefault('tv', [])
+                    tv.append( (time, state[code]) )
+
+    _parse_body(fh, data, time, mult, use_stdout, compact, end)
+    _trim_window(data, use_stdout, compact, start)
+
+
+def _trim_window(data, use_stdout, compact, start):
+    """Cut every tv list of data so that it begins at start."""
+
+    if not use_stdout:
+        for d in data.values():
+            if compact:
+                d.trim_before(start)
+            elif 'tv' in d:
+                d['tv'] = _trim_before(d['tv'], start)
+                if not d['tv']:
+                    del d['tv']
+
+
+def _trim_before(tv, start):
+    """Cut a tv list so that it begins with the value held at start."""
+
+    i = bisect.bisect_right([t for t, v in tv], start)
+    if i == 0:
+        return tv
+    t, v = tv[i-1]
+    return [(start, v)] + tv[i:]
+
+
+# Size of the blocks read from the value-change section of a VCD file.
+BLOCK_SIZE = 1 << 20
+
+_SCALAR_VALUES = {c: chr(c) for c in b'01xXzZ'}
+_VECTOR_PREFIXES = frozenset(b'bBrR')
+
+
+# Number of decompressed blocks that may wait between the decompressing
+# thread and the parser.
+READAHEAD_BLOCKS = 8
+
+# magic bytes -> compression
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+
+
+def vcd_compression(file):
+    """Return 'gzip', 'xz' or 'zstd' if the file is compressed, from its
+    magic bytes (not its name), else None."""
+
+    with open(file, 'rb') as fh:
+        head = fh.read(6)
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _open_decompressed(file, compression):
+    if compression == 'gzip':
+        return gzip.open(file, 'rb')
+    if compression == 'xz':
+        return lzma.open(file, 'rb')
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(file, 'rb')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise VCDParseError("Error: reading the zstd compressed VCD file "\
+                +file+" needs the zstandard module.")
+    # a file may hold several frames (e.g. written in chunks or
+    #   concatenated), which the stream reader stops after by default
+    return zstandard.ZstdDecompressor().stream_reader(open(file, 'rb'),
+                                                       closefd=True,
+                                                       read_across_frames=True)
+
+
+# Defaults of Follow: a followed file is finished once it has not grown
+# for FOLLOW_TIMEOUT seconds; it is polled every FOLLOW_INTERVAL seconds.
+FOLLOW_TIMEOUT = 60.0
+FOLLOW_INTERVAL = 0.2
+
+
+class Follow(object):
+    """How to read a VCD file that is still being written.
+
+    The file is finished once the writing process pid (if given) has
+    exited, or once it has not grown for timeout seconds (None: wait for
+    the pid only).  Until then, reading past the end waits for more data,
+    polling every interval seconds."""
+
+    def __init__(self, timeout=FOLLOW_TIMEOUT, pid=None, interval=FOLLOW_INTERVAL):
+        self.timeout = timeout
+        self.pid = pid
+        self.interval = interval
+
+    def writer_exited(self):
+        if self.pid is None:
+            return False
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+
+def open_vcd(file, follow=None):
+    """Open a VCD file for reading as bytes.
+
+    gzip, xz and zstd compressed files are decompressed as a stream: a
+    background thread decompresses blocks into a bounded queue while the
+    caller parses the blocks before them, so decoding and parsing overlap
+    (the decompressors release the GIL) and nothing is written to disk.
+
+    With follow (a Follow), the file is read while it is still being
+    written: reads at its end wait for new data until the file is
+    finished.  A followed file must be plain VCD; a compressed one raises
+    VCDParseError."""
+
+    if follow is not None:
+        if os.path.exists(file) and vcd_compression(file) is not None:
+            raise VCDParseError("Error: the compressed VCD file "+file+\
+                    " cannot be followed, only a plain VCD file can.")
+        return _FollowingReader(file, follow)
+    compression = vcd_compression(file)
+    if compression is None:
+        return open(file, 'rb')
+    return _DecompressingReader(_open_decompressed(file, compression))
+
+
+class _StreamReader(object):
+    """Read-only, non-seekable file object over the blocks returned by
+    _next_block() (b'' at the end).  Supports what the parser uses:
+    read(), readline(), tell() and iteration over lines."""
+
+    def __init__(self):
+        self._buf = b''
+        self._off = 0       # start of the unread part of _buf
+        self._pos = 0       # stream position of _buf[_off]
+        self._eof = False
+
+    def _block(self):
+        if self._eof:
+            return b''
+        try:
+            block = self._next_block()
+        except Exception:
+            self._eof = True
+            raise
+        if not block:
+            self._eof = True
+        return block
+
+    def read(self, size=-1):
+        if size < 0:
+            chunks = [self._buf[self._off:]]
+            while not self._eof:
+                chunks.append(self._block())
+            self._buf, self._off = b'', 0
+            data = b''.join(chunks)
+        else:
+            # at most the rest of the current block; a slice of a whole
+            #   block is the block itself, not a copy
+            if self._off == len(self._buf):
+                self._buf, self._off = self._block(), 0
+            data = self._buf[self._off:self._off+size]
+            self._off += len(data)
+        self._pos += len(data)
+        return data
+
+    def readline(self):
+        end = self._buf.find(b'\n', self._off)
+        while end == -1 and not self._eof:
+            self._buf = self._buf[self._off:] + self._block()
+            self._off = 0
+            end = self._buf.find(b'\n')
+        end = len(self._buf) if end == -1 else end + 1
+        line = self._buf[self._off:end]
+        self._off = end
+        self._pos += len(line)
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def tell(self):
+        return self._pos
+
+    def seekable(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class _DecompressingReader(_StreamReader):
+    """Reader of a decompressed stream, filled by a background thread
+    through a bounded queue of blocks."""
+
+    def __init__(self, raw, block_size=BLOCK_SIZE, depth=READAHEAD_BLOCKS):
+        _StreamReader.__init__(self)
+        self._raw = raw
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill,
+                                        args=(block_size,), daemon=True)
+        self._thread.start()
+
+    def _fill(self, block_size):
+        try:
+            while not self._stop.is_set():
+                block = self._raw.read(block_size)
+                self._put(block)
+                if not block:
+                    break
+        except Exception as e:  # handed over to the reading thread
+            self._put(e)
+
+    def _put(self, item):
+        # wait for room, but give up once the reader is closed
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _next_block(self):
+        block = self._queue.get()
+        if isinstance(block, Exception):
+            raise block
+        return block
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self._raw.close()
+
+
+class _FollowingReader(_StreamReader):
+    """Reader of a VCD file that is still being written (see Follow).
+    At the current end of the file it polls for new data, and only ends
+    the stream once the file is finished."""
+
+    def __init__(self, file, follow, block_size=BLOCK_SIZE):
+        _StreamReader.__init__(self)
+        self._follow = follow
+        self._block_size = block_size
+        self._finished = False
+        # the writer may not have created the file yet
+        self._wait_for(lambda: os.path.exists(file))
+        if not os.path.exists(file):
+            raise VCDParseError("Error: the followed VCD file "+file+\
+                    " was not created.")
+        self._fh = open(file, 'rb', buffering=0)
+        self._file = file
+        self._checked = False
+
+    def _wait_for(self, ready):
+        """Poll until ready() is true or the file is finished."""
+        follow = self._follow
+        start = _time.monotonic()
+        while not ready():
+            if follow.writer_exited() or (follow.timeout is not None and
+                    _time.monotonic() - start >= follow.timeout):
+                self._finished = True
+                return
+            _time.sleep(follow.interval)
+
+    def _next_block(self):
+        while True:
+            # once the file is finished, this last read still picks up
+            #   what was written just before
+            block = self._fh.read(self._block_size)
+            if block and not self._checked:
+                # the file may have been empty when it was opened
+                self._checked = True
+                if any(block.startswith(magic) for magic, _ in _MAGIC):
+                    raise VCDParseError("Error: the compressed VCD file "+\
+                            self._file+" cannot be followed, only a "\
+                            "plain VCD file can.")
+            if block or self._finished:
+                return block
+            size = self._fh.tell()
+            self._wait_for(lambda: os.fstat(self._fh.fileno()).st_size > size)
+
+    def close(self):
+        self._fh.close()
+
+
+class _CountingReader(object):
+    """Wraps an open VCD file and adds the lines and bytes read through it
+    to counts, so they are measured in the same pass as the parse."""
+
+    def __init__(self, fh, counts):
+        self._fh = fh
+        self._counts = counts
+        counts.setdefault('lines', 0)
+        counts.setdefault('bytes', 0)
+
+    def _count(self, data):
+        self._counts['lines'] += data.count(b'\n')
+        self._counts['bytes'] += len(data)
+        return data
+
+    def read(self, size=-1):
+        return self._count(self._fh.read(size))
+
+    def readline(self):
+        return self._count(self._fh.readline())
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __getattr__(self, name):
+        # seek(), tell(), seekable(), ...
+        return getattr(self._fh, name)
+
+
+class _StdoutTV(object):
+    """Stand-in for a tv list that prints t-v pairs as they are parsed."""
+
+    def append(self, tv):
+        print( tv[0], tv[1] )
+
+
+def _iter_body_tokens(fh, block_size=BLOCK_SIZE):
+    """Yield the whitespace-separated tokens of the rest of fh as bytes.
+
+    The file is read in large blocks that are cut at the last newline and
+    split in one go, so no per-line readline()/strip()/decode() work is
+    done for the value-change section."""
+
+    rest = b''
+    while True:
+        block = fh.read(block_size)
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind(b'\n')
+        if cut == -1:
+            rest = block
+            continue
+        rest = block[cut+1:]
+        yield from block[:cut].split()
+    yield from rest.split()
+
+
+def _parse_body(fh, data, time, mult, use_stdout=0, compact=0, end=None,
+                steps=None):
+    """Parse the value-change section of a VCD file into data.
+
+    The identifier codes of the selected signals are looked up once, so
+    value changes of unselected signals are dropped after a single dict
+    lookup on the raw bytes, without building any str or tuple for them.
+    Parsing stops at the first time after end, if given.
+    With steps (a list or deque), every time of the section is appended to
+    it, including the ones after end, which are then only scanned.
+    Returns the last time seen."""
+
+    global endtime
+
+    # bytes code -> tv list of the selected signals
+    if use_stdout:
+        wanted = {code.encode('ascii'): _StdoutTV() for code in data}
+    elif compact:
+        # Waveform records take (time, value) appends themselves
+        wanted = {code.encode('ascii'): wave for code, wave in data.items()}
+    else:
+        wanted = {code.encode('ascii'): [] for code in data}
+    wanted_get = wanted.get
+    scalar_values = _SCALAR_VALUES
+    vector_prefixes = _VECTOR_PREFIXES
+
+    tokens = _iter_body_tokens(fh)
+    for tok in tokens:
+        c = tok[0]
+        if c in scalar_values:
+            tv = wanted_get(tok[1:])
+            if tv is not None:
+                tv.append( (time, scalar_values[c]) )
+        elif c in vector_prefixes:
+            tv = wanted_get(next(tokens, b''))
+            if tv is not None:
+                tv.append( (time, tok[1:].decode('ascii')) )
+        elif c == 0x23: # '#'
+            time = mult * int(tok[1:])
+            if steps is not None:
+                steps.append(time)
+            if end is not None and time > end:
+                if steps is not None:
+                    _scan_times(tokens, mult, steps)
+                break
+            endtime = time
+        elif tok == b'$comment':
+            for tok in tokens:
+                if tok == b'$end':
+                    break
+
+    if not (use_stdout or compact):
+        for code, tv in wanted.items():
+            if tv:
+                data[code.decode('ascii')].setdefault('tv', []).extend(tv)
+
+    return time
+
+
+def _scan_times(tokens, mult, steps):
+    """Append the times of the rest of a value-change section to steps,
+    skipping the value changes (the code after a vector value may itself
+    start with '#')."""
+
+    vector_prefixes = _VECTOR_PREFIXES
+    for tok in tokens:
+        c = tok[0]
+        if c in vector_prefixes:
+            next(tokens, b'')
+        elif c == 0x23: # '#'
+            steps.append(mult * int(tok[1:]))
+        elif tok == b'$comment':
+            for tok in tokens:
+                if tok == b'$end':
+                    break
+
+
+def _timescale_mult(statement, opt_timescale=''):
+    """Time multiplier of a $timescale statement.  Without one (None) the
+    times are kept in the file's own units (1), by every reader of a file."""
+
+    if statement is None:
+        return 1
+    return calc_mult(statement, opt_timescale)
+
+
+def _skip_header(fh):
+    """Read fh up to and including the $enddefinitions line and return the
+    $timescale statement, or None if there is none."""
+
+    statement = None
+    while True:
+        line = fh.readline()
+        if line == b'' or b'$enddefinitions' in line:
+            break
+        if b'$timescale' in line:
+            statement = line.decode('ascii', 'replace')
+            while not '$end' in statement:
+                line = fh.readline()
+                if line == b'':
+                    break
+                statement += ' ' + line.decode('ascii', 'replace')
+    return statement
+
+
+def iter_vcd_steps(file, codes, opt_timescale='', follow=None):
+    """Stream the value changes of the given identifier codes, one time
+    step at a time.
+
+    Yields (time, changes) for every time step where at least one of the
+    codes changed, changes being the list of (code, value) pairs in file
+    order.  The file is read block by block as the generator is consumed,
+    so memory does not grow with the length of the dump; the codes are
+    usually taken from parse_vcd(file, only_sigs=1).
+
+    With follow (a Follow), the file may still be being written: each
+    time step is yielded as soon as the next one has started, and the
+    last one once the file is finished."""
+
+    global endtime, timescale
+    timescale = None
+
+    wanted = {code.encode('ascii'): code for code in codes}
+    wanted_get = wanted.get
+    scalar_values = _SCALAR_VALUES
+    vector_prefixes = _VECTOR_PREFIXES
+
+    with open_vcd(file, follow) as fh:
+        mult = _timescale_mult(_skip_header(fh), opt_timescale)
+
+        time = 0
+        changes = []
+        tokens = _iter_body_tokens(fh)
+        for tok in tokens:
+            c = tok[0]
+            if c in scalar_values:
+                code = wanted_get(tok[1:])
+                if code is not None:
+                    changes.append( (code, scalar_values[c]) )
+            elif c in vector_prefixes:
+                code = wanted_get(next(tokens, b''))
+                if code is not None:
+                    changes.append( (code, tok[1:].decode('ascii')) )
+            elif c == 0x23: # '#'
+                if changes:
+                    yield time, changes
+                    changes = []
+                time = mult * int(tok[1:])
+                endtime = time
+            elif tok == b'$comment':
+                for tok in tokens:
+                    if tok == b'$end':
+                        break
+        if changes:
+            yield time, changes
+
+
+class Net(object):
+    """Compact net record, with the same fields as the net dicts
+    ('type', 'name', 'size', 'hier'), which can still be indexed
+    like a dict."""
+
+    __slots__ = ('type', 'name', 'size', 'hier')
+
+    def __init__(self, type, name, size, hier):
+        self.type = type
+        self.name = name
+        self.size = size
+        self.hier = hier
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __eq__(self, other):
+        if isinstance(other, Net):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __repr__(self):
+        return 'Net(%r)' % self.as_dict()
+
+    def as_dict(self):
+        return {'type': self.type, 'name': self.name,
+                'size': self.size, 'hier': self.hier}
+
+
+class ValueTable(object):
+    """Interning table shared by the Waveform records of one parse.
+    Each distinct value string is stored once and referred to by index."""
+
+    __slots__ = ('index', 'values')
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def intern(self, value):
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+class TVView(object):
+    """Read-only sequence of (time, value) tuples over a Waveform,
+    for code that still iterates or indexes the 'tv' list."""
+
+    __slots__ = ('wave',)
+
+    def __init__(self, wave):
+        self.wave = wave
+
+    def __len__(self):
+        return len(self.wave.times)
+
+    def __getitem__(self, i):
+        wave = self.wave
+        if isinstance(i, slice):
+            return [(wave.times[j], wave.table.values[wave.values[j]])
+                    for j in range(*i.indices(len(wave.times)))]
+        return (wave.times[i], wave.table.values[wave.values[i]])
+
+    def __iter__(self):
+        values = self.wave.table.values
+        return zip(self.wave.times, (values[v] for v in self.wave.values))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+
+class Waveform(object):
+    """Compact time/value storage for one identifier code.
+
+    Times are kept in an array('q') and values as indexes into a shared
+    ValueTable (array('I')), about 12 bytes per change instead of a
+    (time, value) tuple.  The times array can be wrapped without a copy,
+    e.g. numpy.frombuffer(wave.times, dtype='int64').
+
+    The record answers wave['nets'], wave['tv'] and 'tv' in wave like the
+    dicts returned by parse_vcd, with wave['tv'] being a TVView."""
+
+    __slots__ = ('nets', 'times', 'values', 'table')
+
+    def __init__(self, nets, table):
+        self.nets = [Net(**n) for n in nets]
+        self.times = array('q')
+        self.values = array('I')
+        self.table = table
+
+    def append(self, tv):
+        self.times.append(tv[0])
+        self.values.append(self.table.intern(tv[1]))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __contains__(self, key):
+        if key == 'tv':
+            return len(self.times) > 0
+        return key == 'nets'
+
+    def __getitem__(self, key):
+        if key == 'nets':
+            return self.nets
+        if key == 'tv' and len(self.times):
+            return TVView(self)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def value_at(self, i):
+        return self.table.values[self.values[i]]
+
+    def trim_before(self, start):
+        """Cut the waveform so that it begins with the value held at start."""
+        i = bisect.bisect_right(self.times, start)
+        if i == 0:
+            return
+        value = self.values[i-1]
+        self.times = array('q', [start]) + self.times[i:]
+        self.values = array('I', [value]) + self.values[i:]
+
+
+def _compact_data(data):
+    """Turn the dicts built from the header into Waveform records."""
+
+    table = ValueTable()
+    compact = {}
+    for code, d in data.items():
+        wave = compact[code] = Waveform(d['nets'], table)
+        for tv in d.get('tv', ()):
+            wave.append(tv)
+    return compact
+
+
 def calc_mult (statement, opt_timescale=''):
     """ 
     Calculate a new multiplier for time values.
@@ -357,6 +1311,16 @@ def get_endtime():
 # Limiting the number of signals can substantially reduce memory usage of the
 # returned data structure because only the time-value data for the selected
 # signals is loaded into the data structure.
+#
+# =item select
+#
+# Instead of a signal list, a predicate C<select(hier, name)> can choose the
+# signals.  It is called once per C<$var>, with the dot-separated scope and
+# the signal name, and only the nets for which it returns true are kept.
+# This is how C<vcd2csv> applies the patterns of its signal lists (see
+# C<sigselect>).
+#
+#     vcd = parse_vcd(file, select=lambda hier, name: name.startswith('io_'))
 # 
 # =item use_stdout
 # 
@@ -381,6 +1345,53 @@ def get_endtime():
 # Times are listed in the first column.
 # Times units can be controlled by the C<timescale> option.
 # 
+# =item compact
+# 
+# Store the time-value data in Waveform records instead of lists of
+# tuples.  Times are kept in typed arrays and values are interned, which
+# cuts memory usage several times when all signals of a large VCD file
+# are loaded.  The records can still be read like the default structure
+# (C<wave['nets']>, C<wave['tv']>, C<'tv' in wave>).
+# 
+#     vcd = parse_vcd(file, compact=1)
+# 
+# =item use_index
+# 
+# Keep a header index for the VCD file.  The first parse saves the nets of
+# every identifier code, the timescale and the byte offset of the
+# value-change section to C<file.idx> (or to the C<VCD_INDEX_DIR>
+# directory); later parses of the same unchanged file (same path, size
+# and mtime) load it and seek straight past C<$enddefinitions>.
+# 
+#     vcd = parse_vcd(file, use_index=1)
+# 
+# =item start, end, last
+# 
+# Only return the time window from C<start> to C<end> (in the same units
+# as the returned times), or the last C<last> time steps of the file.
+# Each returned signal starts with its value at C<start>.  A time index
+# (C<file.tidx>) with the byte offset of every time step and periodic
+# snapshots of the signals that changed since the previous snapshot is
+# built on first use, so later windows seek close to C<start> instead of
+# replaying the file from time 0.
+# 
+#     vcd = parse_vcd(file, start=1000, end=2000)
+#     vcd = parse_vcd(file, last=50)
+#
+# Compressed files cannot be seeked and have no time index: they are
+# parsed from time 0 and cut to the window afterwards, which gives the
+# same result without the seek.
+# 
+# =item counts
+# 
+# A dict whose C<lines> and C<bytes> entries are increased by the
+# (decompressed) lines and bytes read while parsing, for profiling without
+# a second pass over the file.  Parts skipped through an index are not
+# read and not counted.
+# 
+#     counts = {}
+#     vcd = parse_vcd(file, counts=counts)
+# 
 # =item only_sigs
 # 
 # Parse a VCD file and return a reference to a data structure which
@@ -408,7 +1419,48 @@ def get_endtime():
 # 
 #     top.chip.cpu.alu.status
 #     top.chip.cpu.alu.sum[15:0]
-# 
+#
+# =head2 open_vcd(file)
+#
+# All functions taking a file name accept gzip, xz and zstd compressed
+# VCD files, recognized by their magic bytes whatever the file name.
+# C<open_vcd> opens a file for reading as bytes; a compressed file is
+# decompressed by a background thread into a bounded queue of
+# C<READAHEAD_BLOCKS> blocks, so decompression and parsing overlap and no
+# decompressed copy is written to disk.  zstd needs Python 3.14 or the
+# C<zstandard> module.  C<vcd_compression(file)> returns the detected
+# compression, or None.  Compressed files are never indexed (C<use_index>
+# is ignored).
+#
+# =head2 Follow(timeout, pid, interval)
+#
+# C<parse_vcd>, C<iter_vcd_steps> and C<open_vcd> take a C<follow> option
+# to read a VCD file that is still being written.  Reading at the end of
+# the file then waits for more data (polling every C<interval> seconds)
+# until the file is finished: the writing process C<pid> has exited, or
+# the file has not grown for C<timeout> seconds.  The file need not exist
+# yet when reading starts.  With C<iter_vcd_steps>, each time step is
+# yielded as soon as the next one starts, so a consumer runs alongside
+# the writer.  Followed files must be plain VCD (a compressed file raises
+# VCDParseError) and are never indexed.
+#
+#     follow = Follow(timeout=60, pid=writer_pid)
+#     sigs = parse_vcd('trace.vcd', only_sigs=1, follow=follow)
+#     for time, changes in iter_vcd_steps('trace.vcd', sigs, follow=follow):
+#         ...
+#
+# =head2 iter_vcd_steps(file, codes, opt_timescale)
+#
+# Stream the value changes of a VCD file instead of loading them all.
+# This is a generator of C<(time, changes)> tuples, one per time step in
+# which at least one of the identifier C<codes> changed, where C<changes>
+# is a list of C<(code, value)> pairs.  The file is only read as far as
+# the generator has been consumed.
+#
+#     sigs = parse_vcd('input.vcd', only_sigs=1)
+#     for time, changes in iter_vcd_steps('input.vcd', sigs):
+#         ...
+#
 # =head2 get_timescale( )
 # 
 # This returns a string corresponding to the timescale as specified
@@ -416,7 +1468,9 @@ def get_endtime():
 # the last VCD file parsed.  If called before a file is parsed, it
 # returns an undefined value.  If the C<parse_vcd> C<timescale> option
 # was used to specify a timescale, the specified value will be returned
-# instead of what is in the VCD file.
+# instead of what is in the VCD file.  For a file without C<$timescale>
+# it returns None, and all functions return times in the file's own
+# units.
 # 
 #     vcd = parse_vcd(file); # Parse a file first
 #     ts  = get_timescale();  # Then query the timescale
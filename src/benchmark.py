@@ -0,0 +1,239 @@
+"""VCD转换流水线的性能测试
+
+用 gen_vcd 生成确定性的合成VCD，然后分别测量各阶段：
+    parse_vcd           vcd2csv.parse_vcd_signals（VCD -> 每个信号的 tv 列表）
+    organize_by_cycle   按周期组织（原来的转换路径，作为基线）
+    export_to_csv       写出CSV（同上）
+    convert_vcd         当前的端到端转换（单遍归并，流式写出CSV）
+    load_csv            replaydata.SignalReplay 读取CSV
+每个阶段在独立的子进程中运行，准备输入的时间不计入；报告 行/秒、MB/秒 和阶段结束时
+子进程的峰值 RSS。结果可保存为基线，之后与基线比较吞吐量以发现性能回退。
+"""
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import tempfile
+import argparse
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import gen_vcd
+import vcd2csv
+import replaydata
+
+STAGES = ['parse_vcd', 'organize_by_cycle', 'export_to_csv', 'convert_vcd', 'load_csv']
+
+# 合成VCD的默认参数
+DEFAULT_CONFIG = {'signals': 200, 'width': 16, 'cycles': 20000, 'density': 0.1, 'seed': 1}
+
+DEFAULT_BASELINE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                '..', 'bench', 'benchmark_baseline.json'))
+
+
+# 原来的两遍转换（已由 vcd2csv.convert_vcd 的单遍归并取代），只作为性能基线保留
+def organize_by_cycle(results):
+    """将结果按周期组织（原来的转换路径：先为每个时间点建立全部信号的值，再写出）"""
+    cycle_data = defaultdict(dict)
+    all_times = set()
+    
+    # 收集所有时间点
+    for signal_name, tv_pairs in results.items():
+        for time, value in tv_pairs:
+            all_times.add(time)
+    
+    # 按时间排序
+    sorted_times = sorted(all_times)
+    
+    # 对每个信号，找到每个时间点的值
+    for signal_name, tv_pairs in results.items():
+        current_value = 'x'  # 默认值
+        tv_index = 0
+        
+        for time in sorted_times:
+            # 更新当前值
+            while tv_index < len(tv_pairs) and tv_pairs[tv_index][0] <= time:
+                current_value = tv_pairs[tv_index][1]
+                tv_index += 1
+            
+            cycle_data[time][signal_name] = current_value
+    
+    return cycle_data, sorted_times
+
+def export_to_csv(cycle_data, sorted_times, signal_list, output_file):
+    """导出数据到CSV文件"""
+    # 获取所有信号名称
+    all_signals = set()
+    for time_data in cycle_data.values():
+        all_signals.update(time_data.keys())
+    all_signals = sorted(all_signals)  # 排序以保持一致的列顺序
+    
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        
+        # 写入表头
+        header = ['Time'] + all_signals
+        writer.writerow(header)
+        
+        # 写入每个时间点的数据
+        for time in sorted_times:
+            row = [time]
+            for signal in all_signals:
+                row.append(cycle_data[time].get(signal, 'x'))
+            writer.writerow(row)
+
+
+def _count_lines(path):
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+
+
+def _peak_rss_mb():
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_stage(stage, vcd_file, signals, work_dir):
+    """在子进程中运行一个阶段，返回 (处理的行数, 处理的字节数或 None, 墙钟时间, CPU时间, 峰值RSS)"""
+    csv_file = os.path.join(work_dir, f'{stage}.csv')
+    # 不计时的准备工作
+    if stage in ('organize_by_cycle', 'export_to_csv'):
+        results, _, _ = vcd2csv.parse_vcd_signals(vcd_file, signals)
+    if stage == 'export_to_csv':
+        cycle_data, sorted_times = organize_by_cycle(results)
+    if stage == 'load_csv':
+        vcd2csv.convert_vcd(vcd_file, signals, csv_file)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if stage == 'parse_vcd':
+        vcd2csv.parse_vcd_signals(vcd_file, signals)
+    elif stage == 'organize_by_cycle':
+        _, rows = organize_by_cycle(results)
+    elif stage == 'export_to_csv':
+        export_to_csv(cycle_data, sorted_times, signals, csv_file)
+    elif stage == 'convert_vcd':
+        vcd2csv.convert_vcd(vcd_file, signals, csv_file)
+    elif stage == 'load_csv':
+        replaydata.SignalReplay(csv_file)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+
+    # 输入为VCD的阶段按VCD计量，读写CSV的阶段按CSV计量，organize_by_cycle 按产生的行数计量
+    if stage == 'organize_by_cycle':
+        return len(rows), None, wall, cpu, _peak_rss_mb()
+    measured = vcd_file if stage in ('parse_vcd', 'convert_vcd') else csv_file
+    return _count_lines(measured), os.path.getsize(measured), wall, cpu, _peak_rss_mb()
+
+
+def run_stage(stage, vcd_file, signals, work_dir):
+    """在新启动的子进程中运行阶段，使峰值RSS只反映该阶段（及其准备工作）"""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_run_stage, stage, vcd_file, signals, work_dir).result()
+
+
+def run_benchmark(config, stages=STAGES, repeat=1, work_dir=None):
+    """生成合成VCD并测量各阶段，返回结果记录"""
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='vcd_bench_')
+    try:
+        vcd_file = os.path.join(work_dir, 'synthetic.vcd')
+        lines, changes = gen_vcd.generate_vcd(vcd_file, config['signals'], config['width'], config['cycles'],
+                                              config['density'], config['seed'])
+        signals = gen_vcd.signal_names(config['signals'], config['width'])
+        record = {'config': dict(config), 'platform': platform.platform(),
+                  'python': platform.python_version(), 'vcd_lines': lines, 'vcd_bytes': os.path.getsize(vcd_file),
+                  'value_changes': changes, 'stages': {}}
+        for stage in stages:
+            try:
+                runs = [run_stage(stage, vcd_file, signals, work_dir) for _ in range(repeat)]
+            except ImportError as e:
+                print(f"[WARNING] Skipping {stage}: {e}")
+                continue
+            # 取最快的一次
+            nlines, nbytes, wall, cpu, rss = min(runs, key=lambda run: run[2])
+            record['stages'][stage] = {
+                'seconds': round(wall, 4),
+                'cpu_seconds': round(cpu, 4),
+                'lines': nlines,
+                'lines_per_sec': round(nlines / wall) if wall else None,
+                'mb_per_sec': round(nbytes / wall / 1e6, 2) if wall and nbytes is not None else None,
+                'peak_rss_mb': round(max(run[4] for run in runs), 1),
+            }
+        return record
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(record, baseline, tolerance):
+    """与基线比较各阶段的 行/秒，返回低于基线 (1 - tolerance) 倍的阶段列表"""
+    if baseline.get('config') != record['config']:
+        print("[WARNING] Baseline was recorded with a different configuration, not compared")
+        return []
+    regressions = []
+    for stage, result in record['stages'].items():
+        base = baseline['stages'].get(stage)
+        if not base or not base.get('lines_per_sec') or not result['lines_per_sec']:
+            continue
+        ratio = result['lines_per_sec'] / base['lines_per_sec']
+        result['vs_baseline'] = round(ratio, 3)
+        if ratio < 1 - tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def print_table(record):
+    header = ['stage', 'seconds', 'lines/sec', 'MB/sec', 'peak RSS MB', 'vs baseline']
+    rows = [[stage, r['seconds'], r['lines_per_sec'], r['mb_per_sec'], r['peak_rss_mb'], r.get('vs_baseline', '')]
+            for stage, r in record['stages'].items()]
+    widths = [max(len(str(x)) for x in column) for column in zip(header, *rows)]
+    for row in [header] + rows:
+        print('  '.join(str(x).ljust(w) for x, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the VCD to CSV pipeline on a synthetic VCD')
+    parser.add_argument('--signals', type=int, default=DEFAULT_CONFIG['signals'], help='Number of signals')
+    parser.add_argument('--width', type=int, default=DEFAULT_CONFIG['width'], help='Bus width of every signal')
+    parser.add_argument('--cycles', type=int, default=DEFAULT_CONFIG['cycles'], help='Number of cycles')
+    parser.add_argument('--density', type=float, default=DEFAULT_CONFIG['density'], help='Fraction of signals changing per cycle')
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'], help='Random seed')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest is reported')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed throughput drop against the baseline')
+    parser.add_argument('--output', required=False, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    config = {'signals': args.signals, 'width': args.width, 'cycles': args.cycles,
+              'density': args.density, 'seed': args.seed}
+    record = run_benchmark(config, args.stages, args.repeat)
+    print(f"[INFO] Synthetic VCD: {record['vcd_lines']} lines, {record['vcd_bytes'] / 1e6:.1f} MB, "
+          f"{record['value_changes']} value changes")
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(record, f, indent=1)
+        print(f"[INFO] Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(record, json.load(f), args.tolerance)
+
+    print_table(record)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(record, f, indent=1)
+    if regressions:
+        print(f"[ERROR] Throughput regression against {args.baseline}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""生成确定性的合成VCD文件，用于性能测试
+
+相同的参数（含随机种子）总是生成完全相同的文件。信号位于 top 作用域下，
+每个周期一个时间点（#0, #10, ...），每个周期按翻转密度随机选择一部分信号改变取值。
+"""
+import random
+import argparse
+
+
+def vcd_code(i):
+    """第 i 个信号的VCD标识符（可打印字符 ! 到 ~ 组成的 94 进制数）"""
+    code = ''
+    while True:
+        code += chr(33 + i % 94)
+        i //= 94
+        if i == 0:
+            return code
+
+
+def signal_names(signals, width):
+    """合成信号的名称（与 vcd2csv 中的叶子名一致，含位宽）"""
+    suffix = f'[{width-1}:0]' if width > 1 else ''
+    return [f'sig{i}{suffix}' for i in range(signals)]
+
+
+def generate_vcd(output_file, signals=100, width=8, cycles=1000, density=0.1, seed=1, period=10):
+    """写出合成VCD文件，返回 (行数, 值变化数)
+    signals 信号数，width 每个信号的位宽，cycles 周期数，
+    density 每个周期改变取值的信号比例（0~1），seed 随机种子"""
+    rng = random.Random(seed)
+    codes = [vcd_code(i) for i in range(signals)]
+    changes_per_cycle = max(0, min(signals, round(signals * density)))
+
+    def value(code):
+        if width == 1:
+            return f'{rng.getrandbits(1)}{code}'
+        return f'b{rng.getrandbits(width):0{width}b} {code}'
+
+    lines = 0
+    changes = 0
+    with open(output_file, 'w') as f:
+        header = [
+            '$date synthetic $end',
+            '$version gen_vcd.py $end',
+            '$timescale 1 ns $end',
+            '$scope module top $end',
+        ]
+        for i, code in enumerate(codes):
+            range_ = f' [{width-1}:0]' if width > 1 else ''
+            header.append(f'$var wire {width} {code} sig{i}{range_} $end')
+        header += ['$upscope $end', '$enddefinitions $end', '#0', '$dumpvars']
+        header += [value(code) for code in codes]
+        header.append('$end')
+        f.write('\n'.join(header) + '\n')
+        lines += len(header)
+        changes += signals
+
+        for cycle in range(1, cycles):
+            chunk = [f'#{cycle * period}']
+            chunk += [value(codes[i]) for i in sorted(rng.sample(range(signals), changes_per_cycle))]
+            f.write('\n'.join(chunk) + '\n')
+            lines += len(chunk)
+            changes += changes_per_cycle
+    return lines, changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic VCD file')
+    parser.add_argument('--output', required=True, help='Output VCD file')
+    parser.add_argument('--signals', type=int, default=100, help='Number of signals')
+    parser.add_argument('--width', type=int, default=8, help='Bus width of every signal (1: scalar)')
+    parser.add_argument('--cycles', type=int, default=1000, help='Number of cycles (time steps)')
+    parser.add_argument('--density', type=float, default=0.1, help='Fraction of signals changing per cycle')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--inputs', required=False, help='Also write an input list with every signal')
+    args = parser.parse_args()
+
+    lines, changes = generate_vcd(args.output, args.signals, args.width, args.cycles, args.density, args.seed)
+    if args.inputs:
+        with open(args.inputs, 'w') as f:
+            f.write('\n'.join(signal_names(args.signals, args.width)) + '\n')
+    print(f"[INFO] {args.output}: {lines} lines, {changes} value changes")
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,236 @@
 import os
+import json
+import time
+import shutil
+import hashlib
 import argparse
-from cocotb_test.simulator import run
+import subprocess
+from cocotb_test.simulator import run, Verilator
+
+import sigselect
+import native_replay
+import Verilog_VCD
+import profiling
+
+# 编译缓存目录中记录最近使用时间的文件
+LAST_USED = '.last_used'
+
+def verilator_version():
+    """返回 verilator --version 的输出，找不到 verilator 时返回空字符串"""
+    try:
+        return subprocess.run(['verilator', '--version'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+def build_cache_key(verilog_sources, toplevel, compile_args):
+    """根据RTL源文件内容、顶层模块、编译参数和Verilator版本计算缓存键"""
+    h = hashlib.sha256()
+    for source in verilog_sources:
+        h.update(os.path.basename(source).encode() + b'\0')
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        h.update(b'\0')
+    h.update(toplevel.encode() + b'\0')
+    h.update('\0'.join(compile_args).encode() + b'\0')
+    h.update(verilator_version().encode())
+    return h.hexdigest()[:16]
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def evict_build_cache(cache_dir, max_bytes, keep):
+    """按最近使用时间淘汰编译缓存，直到总大小不超过 max_bytes（不淘汰 keep）"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path):
+            continue
+        stamp = os.path.join(path, LAST_USED)
+        last_used = os.path.getmtime(stamp) if os.path.exists(stamp) else os.path.getmtime(path)
+        entries.append((last_used, path, _dir_size(path)))
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        print(f"[INFO] Evicted build cache entry {path}")
+
+def cached_sim_build(cache_dir, verilog_sources, toplevel, compile_args, max_mb=None):
+    """返回该设计对应的编译目录：相同设计复用同一个已编译的仿真模型"""
+    key = build_cache_key(verilog_sources, toplevel, compile_args)
+    sim_build = os.path.join(cache_dir, f'{toplevel}-{key}')
+    hit = os.path.exists(os.path.join(sim_build, toplevel))
+    os.makedirs(sim_build, exist_ok=True)
+    with open(os.path.join(sim_build, LAST_USED), 'w') as f:
+        f.write(str(time.time()))
+    print(f"[INFO] Build cache {'hit' if hit else 'miss'}: {sim_build}")
+    if max_mb is not None:
+        evict_build_cache(cache_dir, max_mb * 1024 * 1024, keep=sim_build)
+    return sim_build
+
+class PrebuiltVerilator(Verilator):
+    """直接运行编译目录中已有的仿真模型，不再调用 verilator/make"""
+    def build_command(self):
+        return super().build_command()[-1:]
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--top', required=True, help='Top-level module name')
     parser.add_argument('--clock', required=True, help='clock name')
     parser.add_argument('--rtl', required=True, help='RTL file path')
-    parser.add_argument('--csv', required=True, help='Stimuli CSV file')
-    parser.add_argument('--id', required=True, help='Test ID: 0-0: coverage0[0]')
+    stimuli = parser.add_mutually_exclusive_group(required=True)
+    stimuli.add_argument('--csv', nargs='+', help='Stimuli CSV file(s), replayed back to back in one simulation')
+    stimuli.add_argument('--vcd', nargs='+', help='VCD file(s) replayed directly, without converting to CSV (needs --inputs)')
+    parser.add_argument('--inputs', required=False, help='Input signal list file for --vcd')
+    parser.add_argument('--id', required=True, nargs='+', help='Test ID: 0-0: coverage0[0], one for all or one per CSV')
     parser.add_argument('--cmpcsv', required=False, help='Comparison CSV file')
     parser.add_argument('--reglist', required=False, help='Comparison reglist file')
+    parser.add_argument('--report', default='mismatch_report.json', help='Mismatch report file (.json or .csv)')
+    parser.add_argument('--verbosity', type=int, default=1, help='0: results only, 1: mismatches, 2: per-cycle trace')
+    parser.add_argument('--max-repeats', type=int, default=10, help='Max log messages per mismatching signal')
+    parser.add_argument('--build-cache', default='sim_build_cache', help='Compiled model cache directory')
+    parser.add_argument('--build-cache-max-mb', type=int, default=None, help='Evict least recently used models above this size')
+    parser.add_argument('--no-build-cache', action='store_true', help='Always build in ./sim_build')
+    parser.add_argument('--work-dir', default='run', help='Simulation working directory')
+    parser.add_argument('--result-file', required=False, help='Write the coverage result as JSON to this file')
+    parser.add_argument('--compile-only', action='store_true', help='Only build the simulation model')
+    parser.add_argument('--skip-build', action='store_true',
+                        help='Run the model already built in the build cache without invoking verilator/make')
+    parser.add_argument('--reset', default='reset', help='Reset port asserted between stimuli')
+    parser.add_argument('--reset-cycles', type=int, default=2, help='Reset cycles between stimuli')
+    parser.add_argument('--all-coverage', choices=['final', 'cycle'], default=None,
+                        help='Read every coverage* vector at the end (final) or at every cycle (cycle)')
+    parser.add_argument('--coverage-file', default='coverage_hits.json', help='Coverage hit set output file')
+    parser.add_argument('--early-exit', action='store_true', help='Stop replaying as soon as the target coverage bit fires')
+    parser.add_argument('--backend', choices=['cocotb', 'native'], default='cocotb',
+                        help='cocotb: drive inputs through VPI every cycle; native: replay from a generated $readmemh harness')
+    parser.add_argument('--profile', required=False, metavar='FILE',
+                        help='Write per-stage wall/CPU time, peak memory and counts as JSON to this file')
+    parser.add_argument('--follow', action='store_true',
+                        help='Replay the --vcd file(s) while they are still being written')
+    parser.add_argument('--follow-timeout', type=float, default=Verilog_VCD.FOLLOW_TIMEOUT,
+                        help='With --follow, a VCD is finished once it has not grown for this many seconds')
+    parser.add_argument('--follow-pid', type=int, default=None,
+                        help='With --follow, a VCD is finished once this (writer) process has exited')
     args = parser.parse_args()
 
     # 设置环境变量
-    os.environ['CSV_FILE'] = args.csv
-    os.environ['TEST_ID'] = args.id
+    stimuli = args.csv or args.vcd
+    if args.skip_build and args.compile_only:
+        parser.error('--skip-build cannot be combined with --compile-only')
+    if len(args.id) not in (1, len(stimuli)):
+        parser.error('--id takes one ID or one ID per --csv/--vcd file')
+    if args.vcd:
+        if not args.inputs:
+            parser.error('--vcd requires --inputs')
+        os.environ['VCD_FILE'] = os.pathsep.join(args.vcd)
+        os.environ['INPUTS_FILE'] = os.path.abspath(args.inputs)
+        if args.follow:
+            os.environ['VCD_FOLLOW'] = '1'
+            os.environ['FOLLOW_TIMEOUT'] = str(args.follow_timeout)
+            if args.follow_pid is not None:
+                os.environ['FOLLOW_PID'] = str(args.follow_pid)
+    elif args.follow:
+        parser.error('--follow requires --vcd')
+    else:
+        os.environ['CSV_FILE'] = os.pathsep.join(args.csv)
+    os.environ['TEST_ID'] = os.pathsep.join(args.id)
+    os.environ['RESET'] = args.reset
+    os.environ['RESET_CYCLES'] = str(args.reset_cycles)
+    if args.early_exit:
+        os.environ['EARLY_EXIT'] = '1'
+    if args.all_coverage:
+        os.environ['COVERAGE_MODE'] = args.all_coverage
+        os.environ['COVERAGE_FILE'] = args.coverage_file
     os.environ['CLOCK'] = args.clock
     os.environ['SIM'] = 'verilator'
     if hasattr(args, 'cmpcsv') and args.cmpcsv:
         os.environ['CMPCSV_FILE'] = args.cmpcsv
     if hasattr(args, 'reglist') and args.reglist:
         os.environ['REGLIST_FILE'] = args.reglist
+    os.environ['REPORT_FILE'] = args.report
+    os.environ['REPLAY_VERBOSITY'] = str(args.verbosity)
+    os.environ['REPLAY_MAX_REPEATS'] = str(args.max_repeats)
+    if args.result_file:
+        os.environ['RESULT_FILE'] = os.path.abspath(args.result_file)
+    # 仿真中的重放阶段由 test_stimuli 写入同一个文件，结束后与本进程的阶段合并
+    profiler = profiling.Profiler(enabled=bool(args.profile))
+    if args.profile:
+        profile_file = os.path.abspath(args.profile)
+        os.environ['PROFILE_FILE'] = profile_file
+        if os.path.exists(profile_file):
+            os.remove(profile_file)
         
     # current directory
     os.environ['PWD'] = os.getcwd()
 
-    # 运行测试
-    run(
-        verilog_sources=[args.rtl],
-        toplevel=args.top,
-        module='test_stimuli',
-        sim_build='sim_build',
-        work_dir='run',
-        compile_args=['-Wno-fatal'],
-        gui=False
-    )
+    verilog_sources = [args.rtl]
+    toplevel = args.top
+    compile_args = ['-Wno-fatal']
+    plus_args = []
+    if args.backend == 'native':
+        if len(stimuli) > 1 or args.cmpcsv or args.early_exit or args.all_coverage == 'cycle' or args.follow:
+            parser.error('--backend native replays one stimulus and does not support --cmpcsv, --early-exit, '
+                         '--all-coverage cycle or --follow')
+        # 生成外壳和激励存储器，输入由外壳在仿真器内部驱动
+        input_signals = sigselect.read_pattern_list(args.inputs) if args.vcd else None
+        with profiler.stage('native_harness') as counts:
+            toplevel, harness_file, memory_file, cycles, ignored = native_replay.generate(
+                args.rtl, args.top, args.clock, stimuli[0], os.path.join(args.work_dir, 'native'), input_signals)
+            counts['cycles'] = cycles
+        for signal in ignored:
+            print(f"[WARNING] {signal} is not an input port of {args.top} with a constant width, "
+                  "not driven by the native harness")
+        verilog_sources.append(harness_file)
+        compile_args.append('--timing')
+        plus_args = [f'+STIM={memory_file}', f'+CYCLES={cycles}']
+        os.environ['REPLAY_BACKEND'] = 'native'
+
+    # 相同的RTL、顶层、编译参数和Verilator版本复用同一个编译结果
+    if args.no_build_cache:
+        sim_build = 'sim_build'
+    else:
+        with profiler.stage('build_cache'):
+            sim_build = cached_sim_build(args.build_cache, verilog_sources, toplevel, compile_args, args.build_cache_max_mb)
+
+    # 并行重放共享同一个编译目录时只运行已编译的模型，避免同时编译
+    if args.skip_build and not os.path.exists(os.path.join(sim_build, toplevel)):
+        parser.error(f'--skip-build: no model built in {sim_build}, build it with --compile-only first')
+    simulate = (lambda **kwargs: PrebuiltVerilator(**kwargs).run()) if args.skip_build else run
+
+    # 运行测试（编译和仿真在子进程中进行，其 CPU 时间单独记为 child_cpu_seconds）
+    child_cpu = profiling.children_cpu_seconds()
+    with profiler.stage('simulation'):
+        simulate(
+            verilog_sources=verilog_sources,
+            toplevel=toplevel,
+            module='test_stimuli',
+            sim_build=sim_build,
+            work_dir=args.work_dir,
+            compile_args=compile_args,
+            plus_args=plus_args,
+            compile_only=args.compile_only,
+            gui=False
+        )
+    if args.profile:
+        profiler.stages['simulation']['child_cpu_seconds'] = round(profiling.children_cpu_seconds() - child_cpu, 6)
+        replay = None
+        if os.path.exists(profile_file):
+            with open(profile_file) as f:
+                replay = json.load(f)
+        profiler.write(profile_file, backend=args.backend, stimuli=stimuli, replay=replay)
+        print(f"[INFO] Profile written to {args.profile}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
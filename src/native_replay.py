@@ -0,0 +1,304 @@
+"""原生重放：把激励（CSV、二进制激励文件或VCD）转换为 $readmemh 格式的激励存储器，
+并生成包住DUT的 Verilog 外壳，由外壳在仿真器内部逐周期驱动输入，不再经过VPI。
+
+外壳的时序与 test_stimuli 中的 cocotb 重放一致：每个周期拉低时钟的同时写入该周期的输入，
+1ns 后拉高时钟（输入在上升沿之前已经稳定），再保持 1ns；激励结束后再补两个时钟周期，最后置位 done。
+外壳把 DUT 的 coverage* 向量引出为同名端口，cocotb 只需在 done 之后读取覆盖结果。
+
+激励文件路径和周期数通过 +STIM= / +CYCLES= 传入，存储器深度按周期数向上取 2 的幂，
+因此同一设计、同一组输入信号的不同激励通常可以复用同一个编译结果。
+"""
+import os
+import re
+import csv
+import argparse
+
+import stimfile
+import signames
+import sparsecsv
+import vcd2csv
+
+# 存储器最小深度
+MIN_DEPTH = 1024
+
+_RANGE = r'\[\s*(\d+)\s*:\s*(\d+)\s*\]'
+_DECL = re.compile(r'^(input|output|inout|wire|reg|logic)\b((?:\s*(?:wire|reg|logic|signed)\b)*)\s*(?:' + _RANGE + r')?(.*)$', re.S)
+
+
+def _strip_comments(text):
+    text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.S)
+    return re.sub(r'//[^\n]*', ' ', text)
+
+
+def _width(msb, lsb):
+    if msb is None:
+        return 1
+    return abs(int(msb) - int(lsb)) + 1
+
+
+def _skip_parens(text, pos):
+    """返回从 pos 处的左括号开始、与之匹配的右括号之后的位置"""
+    depth = 0
+    for i in range(pos, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(text)
+
+
+def parse_declarations(rtl_file, top):
+    """解析顶层模块的端口和信号声明，返回 {name: (kind, width)}
+    kind 为 input/output/inout/wire/reg/logic；只支持常数位宽 [msb:lsb]，
+    参数化位宽的信号不会出现在结果中"""
+    with open(rtl_file, 'r', errors='replace') as f:
+        text = _strip_comments(f.read())
+    match = re.search(r'\bmodule\s+' + re.escape(top) + r'\b', text)
+    if match is None:
+        raise ValueError(f"module {top} not found in {rtl_file}")
+    end = re.compile(r'\bendmodule\b').search(text, match.end())
+    body = text[match.end():end.start() if end else len(text)]
+
+    declarations = {}
+    # ANSI 风格的端口列表：module top #(...) (input [3:0] a, output b);
+    pos = 0
+    hash_pos = body.find('#')
+    paren = body.find('(')
+    if hash_pos != -1 and hash_pos < paren:
+        paren = body.find('(', _skip_parens(body, body.find('(', hash_pos)))
+    if paren != -1 and paren < body.find(';'):
+        pos = _skip_parens(body, paren)
+        kind, width = None, 1
+        for item in body[paren+1:pos-1].split(','):
+            item = item.strip()
+            decl = _DECL.match(item)
+            if decl:
+                kind, width = decl.group(1), _width(decl.group(3), decl.group(4))
+                item = decl.group(5)
+                # 参数化位宽（[W-1:0]），其后沿用该声明的端口也一并跳过
+                if re.match(r'\s*\[', item):
+                    kind = None
+            names = re.findall(r'[A-Za-z_][\w$]*', item)
+            if kind and names:
+                declarations[names[-1]] = (kind, width)
+
+    # 模块体中的声明：input [3:0] a, b; reg [7:0] c = 0;
+    for statement in body[pos:].split(';'):
+        decl = _DECL.match(statement.strip())
+        if not decl or re.match(r'\s*\[', decl.group(5)):
+            continue
+        kind, width = decl.group(1), _width(decl.group(3), decl.group(4))
+        for item in decl.group(5).split(','):
+            name = re.match(r'\s*([A-Za-z_][\w$]*)', item)
+            if name:
+                # 端口在模块体中再次声明为 wire/reg 时保留方向
+                if name.group(1) not in declarations or kind in ('input', 'output', 'inout'):
+                    declarations[name.group(1)] = (kind, width)
+    return declarations
+
+
+def read_stimulus(stimulus, input_signals=None):
+    """读取激励，返回 (信号名列表, 行迭代器)，每行为 (time, 整数值列表)
+    stimulus 为VCD文件时需要给出 input_signals"""
+    if input_signals is not None:
+        results, _, _ = vcd2csv.parse_vcd_signals(stimulus, input_signals)
+        signals = sorted(results)
+        rows = ((time, [stimfile.to_int(v) for v in values])
+                for time, values in vcd2csv.iter_cycle_rows(results, signals))
+        return signals, rows
+    if stimfile.is_stimulus_file(stimulus):
+        reader = stimfile.StimulusReader(stimulus)
+        columns = range(len(reader.signals))
+        rows = ((time, [reader.get_int(i, row) for i in columns])
+                for row, time in enumerate(reader.timestamps))
+        return reader.signals, rows
+    if sparsecsv.is_sparse_csv(stimulus):
+        signals, steps = sparsecsv.read_sparse(stimulus)
+
+        def sparse_rows():
+            values = [0] * len(signals)
+            for time, changes in steps:
+                for i, value in changes:
+                    values[i] = stimfile.to_int(value)
+                yield time, list(values)
+        return signals, sparse_rows()
+
+    f = open(stimulus, 'r', newline='')
+    reader = csv.reader(f)
+    header = next(reader)
+
+    def rows():
+        with f:
+            for row in reader:
+                yield int(row[0]), [stimfile.to_int(v) for v in row[1:]]
+    return header[1:], rows()
+
+
+def plan_inputs(signals, declarations, clock_name):
+    """选出要由外壳驱动的列：清理后的名称是DUT的输入端口且不是时钟
+    返回 [(列下标, 端口名, 位宽)] 以及被忽略的（不是输入端口或位宽不是常数的）信号名"""
+    driven = []
+    ignored = []
+    for i, signal in enumerate(signals):
+        # 去除位宽信息，与 SignalReplay 一致；数组元素不是端口，不会被驱动
+        name = signames.parse_signal_name(signal).key
+        if name == clock_name:
+            continue
+        if declarations.get(name, ('',))[0] == 'input':
+            driven.append((i, name, declarations[name][1]))
+        else:
+            ignored.append(signal)
+    return driven, ignored
+
+
+def write_memory(memory_file, driven, rows):
+    """按 driven 的顺序把每行打包为一个整数（第一个信号在最低位），写出 $readmemh 文件
+    返回周期数"""
+    digits = max((sum(width for _, _, width in driven) + 3) // 4, 1)
+    cycles = 0
+    with open(memory_file, 'w') as f:
+        for _, values in rows:
+            word = 0
+            offset = 0
+            for i, _, width in driven:
+                word |= (values[i] & ((1 << width) - 1)) << offset
+                offset += width
+            f.write(f'{word:0{digits}x}\n')
+            cycles += 1
+    return cycles
+
+
+def memory_depth(cycles):
+    """存储器深度：不小于周期数的 2 的幂"""
+    depth = MIN_DEPTH
+    while depth < cycles:
+        depth *= 2
+    return depth
+
+
+def write_harness(harness_file, top, clock_name, declarations, driven, depth):
+    """生成外壳模块 <top>_replay，返回模块名"""
+    harness_top = f'{top}_replay'
+    row_width = max(sum(width for _, _, width in driven), 1)
+    coverage = sorted((name for name in declarations if re.fullmatch(r'coverage\d+', name)),
+                      key=lambda name: int(name[8:]))
+    driven_names = {name for _, name, _ in driven}
+
+    lines = [
+        '`timescale 1ns/1ps',
+        f'// Generated by native_replay.py for {top}, do not edit.',
+        f'module {harness_top}(',
+        '  output reg done' + (',' if coverage else ''),
+    ]
+    for n, name in enumerate(coverage):
+        sep = ',' if n < len(coverage) - 1 else ''
+        lines.append(f'  output [{declarations[name][1]-1}:0] {name}{sep}')
+    lines += [
+        ');',
+        f'  reg [{row_width-1}:0] stim [0:{depth-1}];',
+        f'  reg [{row_width-1}:0] row = 0;',
+        '  reg clock = 0;',
+        '  reg [8*1024-1:0] stim_file;',
+        '  integer cycles = 0;',
+        '  integer cycle;',
+        '',
+        f'  {top} dut (',
+    ]
+    connections = []
+    offset = 0
+    for _, name, width in driven:
+        connections.append(f'    .{name}(row[{offset + width - 1}:{offset}])')
+        offset += width
+    for name, (kind, width) in declarations.items():
+        if name == clock_name and kind == 'input':
+            connections.append(f'    .{name}(clock)')
+        elif kind == 'input' and name not in driven_names:
+            connections.append(f"    .{name}({width}'d0)")
+        elif kind == 'output' and name in coverage:
+            connections.append(f'    .{name}({name})')
+    lines.append(',\n'.join(connections))
+    lines.append('  );')
+    for name in coverage:
+        if declarations[name][0] != 'output':
+            lines.append(f'  assign {name} = dut.{name};')
+    lines += [
+        '',
+        '  initial begin',
+        '    done = 0;',
+        '    if (!$value$plusargs("STIM=%s", stim_file)) $fatal(1, "+STIM=<file> is required");',
+        '    if (!$value$plusargs("CYCLES=%d", cycles)) $fatal(1, "+CYCLES=<n> is required");',
+        f'    if (cycles > {depth}) $fatal(1, "+CYCLES is larger than the stimulus memory");',
+        '    $readmemh(stim_file, stim);',
+        '    for (cycle = 0; cycle < cycles; cycle = cycle + 1) begin',
+        '      clock = 0;',
+        '      row = stim[cycle];',
+        '      #1;',
+        '      clock = 1;',
+        '      #1;',
+        '    end',
+        '    repeat (2) begin',
+        '      clock = 0;',
+        '      #1;',
+        '      clock = 1;',
+        '      #1;',
+        '    end',
+        '    done = 1;',
+        '  end',
+        'endmodule',
+        '',
+    ]
+    content = '\n'.join(lines)
+    # 内容不变时不改写，保留文件时间戳
+    if os.path.exists(harness_file):
+        with open(harness_file, 'r') as f:
+            if f.read() == content:
+                return harness_top
+    with open(harness_file, 'w') as f:
+        f.write(content)
+    return harness_top
+
+
+def generate(rtl_file, top, clock_name, stimulus, out_dir, input_signals=None):
+    """生成外壳和激励存储器，返回 (外壳模块名, 外壳文件, 存储器文件, 周期数, 被忽略的信号)"""
+    os.makedirs(out_dir, exist_ok=True)
+    declarations = parse_declarations(rtl_file, top)
+    signals, rows = read_stimulus(stimulus, input_signals)
+    driven, ignored = plan_inputs(signals, declarations, clock_name)
+
+    stem = os.path.splitext(os.path.basename(stimulus))[0]
+    memory_file = os.path.abspath(os.path.join(out_dir, f'{stem}.hex'))
+    cycles = write_memory(memory_file, driven, rows)
+    harness_file = os.path.abspath(os.path.join(out_dir, f'{top}_replay.v'))
+    harness_top = write_harness(harness_file, top, clock_name, declarations, driven, memory_depth(cycles))
+    return harness_top, harness_file, memory_file, cycles, ignored
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a native replay harness and $readmemh stimulus memory')
+    parser.add_argument('--rtl', required=True, help='RTL file path')
+    parser.add_argument('--top', required=True, help='Top-level module name')
+    parser.add_argument('--clock', required=True, help='clock name')
+    stimuli = parser.add_mutually_exclusive_group(required=True)
+    stimuli.add_argument('--csv', help='Stimuli CSV (or binary stimulus) file')
+    stimuli.add_argument('--vcd', help='VCD file (needs --inputs)')
+    parser.add_argument('--inputs', required=False, help='Input signal list file for --vcd')
+    parser.add_argument('--out-dir', default='native', help='Output directory')
+    args = parser.parse_args()
+
+    input_signals = None
+    if args.vcd:
+        if not args.inputs:
+            parser.error('--vcd requires --inputs')
+        input_signals = vcd2csv.read_input_list(args.inputs)
+    harness_top, harness_file, memory_file, cycles, ignored = generate(
+        args.rtl, args.top, args.clock, args.csv or args.vcd, args.out_dir, input_signals)
+    for signal in ignored:
+        print(f"[WARNING] {signal} is not an input port of {args.top} with a constant width, not driven")
+    print(f"[INFO] {harness_top}: {harness_file}")
+    print(f"[INFO] Stimulus memory: {memory_file} ({cycles} cycles)")
+    print(f"[INFO] Run with +STIM={memory_file} +CYCLES={cycles}")
+
+if __name__ == "__main__":
+    main()
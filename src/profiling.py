@@ -0,0 +1,124 @@
+"""按阶段记录耗时与资源：墙钟时间、CPU时间、峰值内存（进程 RSS 高水位）和计数
+
+    profiler = Profiler()
+    with profiler.stage('parse_vcd') as counts:
+        ...
+        counts['value_changes'] = n
+    profiler.write('profile.json')
+
+同名阶段多次进入时累加（如每个周期的驱动），calls 记录进入次数。
+未启用的 Profiler 返回共享的空上下文，热循环中几乎没有开销。
+"""
+import json
+import time
+import resource
+import contextlib
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS（MB，Linux 上 ru_maxrss 的单位为 KB）"""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def children_cpu_seconds():
+    """已结束的子进程（如仿真器）累计的 CPU 时间"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'counts', 'wall', 'cpu')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.counts = {}
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self.counts
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.profiler._add(self.name, wall, cpu, self.counts)
+        return False
+
+
+class Profiler:
+    """按阶段累计的性能记录；enabled 为 False 时不做任何记录"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+        self._null = contextlib.nullcontext({})
+
+    def __bool__(self):
+        return self.enabled
+
+    def stage(self, name):
+        """返回阶段的上下文管理器，as 得到的字典用于填写该次的计数"""
+        if not self.enabled:
+            return self._null
+        return _Stage(self, name)
+
+    def _add(self, name, wall, cpu, counts):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0, 'counts': {}}
+        stage['wall_seconds'] += wall
+        stage['cpu_seconds'] += cpu
+        stage['calls'] += 1
+        stage['peak_rss_mb'] = peak_rss_mb()
+        for key, value in counts.items():
+            stage['counts'][key] = stage['counts'].get(key, 0) + value
+
+    def iterate(self, name, iterable):
+        """逐个取出 iterable 的元素，取元素的时间计入阶段 name（用于惰性读取的输入）"""
+        if not self.enabled:
+            return iterable
+        return self._iterate(name, iter(iterable))
+
+    def _iterate(self, name, iterator):
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, **counts):
+        """给已有（或新的）阶段追加计数，不计时"""
+        if self.enabled:
+            self._add(name, 0.0, 0.0, counts)
+            self.stages[name]['calls'] -= 1
+
+    def record(self, **extra):
+        """返回 JSON 记录"""
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage, wall_seconds=round(stage['wall_seconds'], 6),
+                                cpu_seconds=round(stage['cpu_seconds'], 6))
+        return dict(extra, stages=stages, peak_rss_mb=peak_rss_mb())
+
+    def write(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump(self.record(**extra), f, indent=1)
+
+
+def merge_stages(stage_dicts):
+    """合并多次运行的阶段记录（如回归中的每个激励）：时间、次数和计数相加，峰值内存取最大"""
+    merged = {}
+    for stages in stage_dicts:
+        for name, stage in stages.items():
+            total = merged.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0, 'counts': {}})
+            for key in ('wall_seconds', 'cpu_seconds', 'child_cpu_seconds', 'calls'):
+                if key in stage:
+                    total[key] = round(total.get(key, 0) + stage[key], 6)
+            for key, value in stage['counts'].items():
+                total['counts'][key] = total['counts'].get(key, 0) + value
+            if 'peak_rss_mb' in stage:
+                total['peak_rss_mb'] = max(total.get('peak_rss_mb', 0), stage['peak_rss_mb'])
+    return merged
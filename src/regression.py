@@ -0,0 +1,134 @@
+import os
+import re
+import sys
+import csv
+import json
+import glob
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+def discover_stimuli(design_dir):
+    """查找 <design_dir>/<id>/csv/Input_<id>.csv，返回 [(id, csv路径)]"""
+    found = []
+    for path in glob.glob(os.path.join(design_dir, '*', 'csv', 'Input_*.csv')):
+        test_id = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        if os.path.basename(path) == f'Input_{test_id}.csv' and re.fullmatch(r'\d+-\d+', test_id):
+            found.append((test_id, path))
+    # 按 (id1, id2) 数字顺序排列
+    return sorted(found, key=lambda item: tuple(int(x) for x in item[0].split('-')))
+
+def main_command(args, csv_file, test_id, extra):
+    """构造一次 main.py 调用的命令行"""
+    return [sys.executable, MAIN, '--top', args.top, '--clock', args.clock, '--rtl', args.rtl,
+            '--csv', csv_file, '--id', test_id, '--build-cache', args.build_cache,
+            '--verbosity', str(args.verbosity)] + extra
+
+def run_one(args, test_id, csv_file):
+    """在独立的 work_dir 中重放一个激励，返回结果记录"""
+    work_dir = os.path.join(args.work_root, test_id)
+    os.makedirs(work_dir, exist_ok=True)
+    result_file = os.path.join(work_dir, 'result.json')
+    if os.path.exists(result_file):
+        os.remove(result_file)
+    # 模型已由 main() 预先编译，各重放只运行它，不在共享的编译目录中重新编译
+    extra = ['--work-dir', work_dir, '--result-file', result_file, '--skip-build',
+             '--report', os.path.join(work_dir, 'mismatch_report.json')]
+    profile_file = os.path.join(work_dir, 'profile.json')
+    if args.profile:
+        extra += ['--profile', profile_file]
+    cmd = main_command(args, csv_file, test_id, extra)
+    start = time.perf_counter()
+    with open(os.path.join(work_dir, 'replay.log'), 'w') as log:
+        proc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT)
+    record = {'id': test_id, 'cover': '', 'status': 'ok', 'seconds': f'{time.perf_counter() - start:.1f}', 'log': log.name}
+    if proc.returncode != 0:
+        record['status'] = f'failed ({proc.returncode})'
+    try:
+        with open(result_file) as f:
+            cover = json.load(f).get('cover')
+        record['cover'] = 'hit' if cover == '1' else 'miss'
+    except (OSError, ValueError):
+        if record['status'] == 'ok':
+            record['status'] = 'no result'
+    if args.profile:
+        try:
+            with open(profile_file) as f:
+                record['profile'] = json.load(f)
+        except (OSError, ValueError):
+            record['profile'] = None
+    return record
+
+def write_profile(path, records):
+    """汇总每个激励的性能记录：逐个列出，并把各阶段合并为总计"""
+    profiles = [r['profile'] for r in records if r.get('profile')]
+    replays = [p['replay'] for p in profiles if p.get('replay')]
+    with open(path, 'w') as f:
+        json.dump({'total': {'stages': profiling.merge_stages(p['stages'] for p in profiles),
+                             'replay': profiling.merge_stages(p['stages'] for p in replays)},
+                   'runs': [{'id': r['id'], **(r.get('profile') or {})} for r in records]}, f, indent=1)
+    print(f"[INFO] Profiles of {len(profiles)} runs written to {path}")
+
+def print_table(records):
+    """打印汇总表"""
+    header = ['id', 'cover', 'status', 'seconds']
+    widths = [max(len(h), *(len(str(r[h])) for r in records)) for h in header]
+    print('  '.join(h.ljust(w) for h, w in zip(header, widths)))
+    for r in records:
+        print('  '.join(str(r[h]).ljust(w) for h, w in zip(header, widths)))
+    hits = sum(1 for r in records if r['cover'] == 'hit')
+    failed = sum(1 for r in records if r['status'] != 'ok')
+    print(f"[RESULT] {hits}/{len(records)} coverage points hit, {failed} failed")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay all stimuli of a design in parallel')
+    parser.add_argument('--design-dir', required=True, help='Design bench directory, e.g. bench/RocketTile_Tiny_Opt')
+    parser.add_argument('--top', required=True, help='Top-level module name')
+    parser.add_argument('--clock', required=True, help='clock name')
+    parser.add_argument('--rtl', required=True, help='RTL file path')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Parallel replays')
+    parser.add_argument('--ids', nargs='*', help='Only replay these coverage IDs')
+    parser.add_argument('--build-cache', default='sim_build_cache', help='Compiled model cache directory')
+    parser.add_argument('--work-root', default='regression', help='Per-run work directories are created here')
+    parser.add_argument('--verbosity', type=int, default=0, help='Replay verbosity')
+    parser.add_argument('--summary', required=False, help='Write the summary table as CSV')
+    parser.add_argument('--profile', required=False, metavar='FILE',
+                        help='Profile every replay and write the collected records as JSON to this file')
+    args = parser.parse_args()
+
+    stimuli = discover_stimuli(args.design_dir)
+    if args.ids:
+        stimuli = [(test_id, path) for test_id, path in stimuli if test_id in args.ids]
+    if not stimuli:
+        print(f"Error: no Input_<id>.csv found under {args.design_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    # 先编译一次，所有重放共享同一个编译结果
+    test_id, csv_file = stimuli[0]
+    build = subprocess.run(main_command(args, csv_file, test_id, ['--compile-only', '--work-dir',
+                                                                  os.path.join(args.work_root, 'build')]))
+    if build.returncode != 0:
+        print("Error: building the simulation model failed", file=sys.stderr)
+        sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        records = list(pool.map(lambda item: run_one(args, *item), stimuli))
+
+    print_table(records)
+    if args.summary:
+        with open(args.summary, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['id', 'cover', 'status', 'seconds', 'log'], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+    if args.profile:
+        write_profile(args.profile, records)
+    if any(r['status'] != 'ok' for r in records):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
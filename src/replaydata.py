@@ -0,0 +1,200 @@
+"""重放与比较使用的激励数据：CSV、二进制激励文件（见 stimfile）、稀疏CSV（见 sparsecsv）
+以及直接流式读取的VCD；不依赖 cocotb，可以在仿真之外使用（例如 benchmark）
+"""
+import csv
+import bisect
+
+import stimfile
+import signames
+import sparsecsv
+import vcd2csv
+
+class SignalReplay:
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        self.signals = {}
+        self.timestamps = []
+        self.signal_names = []
+        self.names = None
+        self.stim = None
+        # 稀疏CSV：每个时间点的变化列表，以及重放时原地更新的当前输入向量（与 VCDReplay 相同）
+        self.steps = None
+        self.values = None
+        self._sparse_columns = None
+        if stimfile.is_stimulus_file(csv_file):
+            self._open_stimulus()
+        elif sparsecsv.is_sparse_csv(csv_file):
+            self._parse_sparse()
+        else:
+            self._parse_csv()
+
+    def _parse_csv(self):
+        """解析CSV文件"""
+        with open(self.csv_file, 'r') as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            # 信号名只解析一次，去除位宽信息（数组元素保留下标）
+            self.names = signames.NameIndex(headers[1:])
+            self.signal_names = self.names.keys
+            
+            # 初始化信号字典
+            for signal in self.signal_names:
+                self.signals[signal] = {}
+            
+            # 读取所有数据
+            for row in reader:
+                time = int(row[0])
+                self.timestamps.append(time)
+                for i, value in enumerate(row[1:], 0):
+                    signal_name = self.signal_names[i]
+                    self.signals[signal_name][time] = value
+
+    def _open_stimulus(self):
+        """以 mmap 方式打开二进制激励文件，数据按需读取，不预先解析"""
+        self.stim = stimfile.StimulusReader(self.csv_file)
+        self.names = signames.NameIndex(self.stim.signals)
+        self.signal_names = self.names.keys
+        self.timestamps = self.stim.timestamps
+
+    def _parse_sparse(self):
+        """读取稀疏CSV（见 sparsecsv），只保存变化，不展开为逐周期的值"""
+        signals, steps = sparsecsv.read_sparse(self.csv_file)
+        self.names = signames.NameIndex(signals)
+        self.signal_names = self.names.keys
+        self.steps = list(steps)
+        self.timestamps = [time for time, _ in self.steps]
+        self.values = [None] * len(signals)
+
+    def get_value_at_time(self, signal_name, time):
+        """获取指定时间点的信号值，signal_name 可以是原始列名或去除位宽后的名称
+        稀疏CSV返回该时间点及之前最后一次变化的值"""
+        if self.stim is not None:
+            row = self.stim.row_of_time.get(time)
+            if row is None:
+                return None
+            return self.stim.get_bits(self.names.column(signal_name), row)
+        if self.steps is not None:
+            return self._sparse_value(self.names.column(signal_name), time)
+        return self.signals[self.names.record(signal_name).key].get(time, None)
+
+    def _sparse_value(self, column, time):
+        if self._sparse_columns is None:
+            # 第一次按时间查询时才建立每个信号的变化列表
+            self._sparse_columns = [([], []) for _ in self.signal_names]
+            for step_time, changes in self.steps:
+                for i, value in changes:
+                    self._sparse_columns[i][0].append(step_time)
+                    self._sparse_columns[i][1].append(value)
+        times, values = self._sparse_columns[column]
+        i = bisect.bisect_right(times, time)
+        return values[i-1] if i else None
+
+    def get_int_at_time(self, signal_name, time):
+        """获取指定时间点的信号整数值（仅二进制激励文件）"""
+        row = self.stim.row_of_time.get(time)
+        if row is None:
+            return None
+        return self.stim.get_int(self.names.column(signal_name), row)
+
+    def iter_times(self):
+        """按顺序遍历所有时间点；稀疏CSV在产生每个时间点前把变化写入 values"""
+        if self.steps is None:
+            return iter(self.timestamps)
+        return self._iter_steps()
+
+    def _iter_steps(self):
+        values = self.values
+        for time, changes in self.steps:
+            for i, value in changes:
+                values[i] = value
+            yield time
+
+class VCDReplay:
+    """直接从VCD文件重放，不生成中间CSV：
+    只读取 input 列表中的信号，仿真推进时逐个时间点流式解析，
+    每个时间点的输入向量在 values 中原地更新（列顺序与 vcd2csv 导出的CSV一致）
+    给出 follow（Verilog_VCD.Follow）时VCD可以仍在写入，重放随写入推进，写完后结束"""
+    def __init__(self, vcd_file, input_signals, follow=None):
+        self.csv_file = vcd_file
+        self.stim = None
+        self.timestamps = None  # 流式读取，事先不知道时间点
+        self.follow = follow
+        # 与 vcd2csv 相同：按选择模式选择，列名为叶子名，同名信号以最后一个为准
+        names, self.columns, _ = vcd2csv.stream_columns(vcd_file, input_signals, follow)
+        self.names = signames.NameIndex(names)
+        self.signal_names = self.names.keys
+        # 尚未出现过变化的信号为 None，不驱动
+        self.values = [None] * len(names)
+
+    def iter_times(self):
+        """逐个时间点读取VCD，更新 values 后产生该时间点"""
+        values = self.values
+        for time, changes in vcd2csv.iter_stream_changes(self.csv_file, self.columns, self.follow):
+            for i, value in changes:
+                values[i] = value
+            yield time
+
+class SignalComparator:
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        self.signals = {}
+        self.timestamps = []
+        self.signal_names = []
+        self.names = None
+        self.stim = None
+        if stimfile.is_stimulus_file(csv_file):
+            self._open_stimulus()
+        elif sparsecsv.is_sparse_csv(csv_file):
+            self._parse_sparse()
+        else:
+            self._parse_csv()
+
+    def _parse_csv(self):
+        """解析CSV文件"""
+        with open(self.csv_file, 'r') as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            # 信号名只解析一次，去除位宽信息（数组元素保留下标）
+            self.names = signames.NameIndex(headers[1:])
+            self.signal_names = self.names.keys
+            
+            # 初始化信号字典
+            for signal in self.signal_names:
+                self.signals[signal] = {}
+            
+            # 读取所有数据
+            for row in reader:
+                time = int(row[0])
+                self.timestamps.append(time)
+                for i, value in enumerate(row[1:], 0):
+                    signal_name = self.signal_names[i]
+                    self.signals[signal_name][time] = value
+
+    def _parse_sparse(self):
+        """读取稀疏CSV，沿用上一时间点的值展开为每个时间点的期望值"""
+        signals, steps = sparsecsv.read_sparse(self.csv_file)
+        self.names = signames.NameIndex(signals)
+        self.signal_names = self.names.keys
+        columns = [self.signals.setdefault(signal, {}) for signal in self.signal_names]
+        values = [None] * len(signals)
+        for time, changes in steps:
+            self.timestamps.append(time)
+            for i, value in changes:
+                values[i] = value
+            for column, value in zip(columns, values):
+                column[time] = value
+
+    def _open_stimulus(self):
+        """以 mmap 方式打开二进制激励文件，数据按需读取，不预先解析"""
+        self.stim = stimfile.StimulusReader(self.csv_file)
+        self.names = signames.NameIndex(self.stim.signals)
+        self.signal_names = self.names.keys
+        self.timestamps = self.stim.timestamps
+
+    def get_value_at_time(self, signal_name, time):
+        if self.stim is not None:
+            row = self.stim.row_of_time.get(time)
+            if row is None:
+                return None
+            return self.stim.get_bits(self.names.column(signal_name), row)
+        return self.signals[signal_name].get(time, None)
@@ -0,0 +1,82 @@
+"""信号名规范化：把 x[31:0]（位宽）、x[3]（数组元素下标）、mem[3][7:0] 以及普通信号名
+统一解析为 (base, index, msb, lsb) 记录。
+
+每个名称只解析一次（进程内共享缓存），vcd2csv、SignalReplay、SignalComparator 和原生重放
+都通过这里查找，不再各自切分字符串。
+"""
+import re
+from collections import namedtuple
+
+_BRACKETS = re.compile(r'\[([^\]]*)\]')
+
+
+class SignalName(namedtuple('SignalName', ['name', 'base', 'index', 'msb', 'lsb'])):
+    """一个信号名的解析结果
+    base  第一个 [ 之前的部分，即DUT中的信号名
+    index 数组元素下标，没有时为 -1
+    msb/lsb 位宽 [msb:lsb]，没有时为 None"""
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """去掉位宽后的名称，数组元素保留下标，如 mem[3][7:0] -> mem[3]，x[31:0] -> x"""
+        return self.base if self.index == -1 else f'{self.base}[{self.index}]'
+
+    @property
+    def width(self):
+        """由 [msb:lsb] 得到的位宽，没有位宽信息时为 1"""
+        if self.msb is None:
+            return 1
+        return abs(self.msb - self.lsb) + 1
+
+
+# 名称 -> SignalName
+_RECORDS = {}
+
+
+def parse_signal_name(name):
+    """解析信号名，结果缓存"""
+    record = _RECORDS.get(name)
+    if record is None:
+        bracket = name.find('[')
+        base = name if bracket == -1 else name[:bracket]
+        index, msb, lsb = -1, None, None
+        if bracket != -1:
+            for part in _BRACKETS.findall(name, bracket):
+                if ':' in part:
+                    left, right = part.split(':', 1)
+                    try:
+                        msb, lsb = int(left), int(right)
+                    except ValueError:
+                        pass
+                elif index == -1:
+                    try:
+                        index = int(part)
+                    except ValueError:
+                        pass
+        record = _RECORDS[name] = SignalName(name, base, index, msb, lsb)
+    return record
+
+
+class NameIndex:
+    """一组列名（CSV表头、二进制激励文件的信号列表）的索引：
+    records 与列一一对应；既可以用原始列名也可以用 key 查找列号"""
+
+    def __init__(self, names):
+        self.records = [parse_signal_name(name) for name in names]
+        self.keys = [record.key for record in self.records]
+        self.columns = {}
+        for i, record in enumerate(self.records):
+            self.columns[record.key] = i
+            self.columns[record.name] = i
+
+    def column(self, name):
+        """原始列名或 key 对应的列号，不存在时为 None"""
+        return self.columns.get(name)
+
+    def record(self, name):
+        """原始列名或 key 对应的 SignalName"""
+        return self.records[self.columns[name]]
+
+    def __len__(self):
+        return len(self.records)
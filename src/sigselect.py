@@ -0,0 +1,121 @@
+"""信号选择：把 input.list / reg.list 中的模式一次性编译为哈希集合、作用域前缀树和正则表达式
+
+每行一个模式（空行和 # 开头的行忽略）：
+    reset                  叶子名精确匹配（VCD中的名称，含位宽，如 io_in[3:0]）
+    TOP.core.reset         完整路径精确匹配（层次.名称）
+    TOP.core.  或 TOP.core.*
+                           该作用域（含所有子作用域）下的全部信号
+    io_*_valid             通配符：* 匹配任意字符，? 匹配单个字符，其余（包括 [ ]）按字面匹配；
+                           含 . 时与完整路径匹配，否则与叶子名匹配
+    re:^io_.*_bits$        正则表达式，与叶子名或完整路径完全匹配即选中；每个正则单独编译，
+                           可以使用 (?i) 等全局标志，无效的正则报告出错的模式
+"""
+import re
+
+# 前缀树中标记作用域终点的键
+_END = None
+
+
+class SignalSelector:
+    """编译后的信号选择器，match(hier, name) 判断一个信号是否被选中"""
+
+    def __init__(self, patterns):
+        self.patterns = []
+        self.names = set()      # 叶子名
+        self.paths = set()      # 完整路径
+        self.scopes = {}        # 作用域前缀树
+        name_wildcards = []
+        path_wildcards = []
+        # re: 模式各自编译，通配符合并为一个正则
+        self.name_regexes = []
+        self.path_regexes = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            self.patterns.append(pattern)
+            if pattern.startswith('re:'):
+                try:
+                    regex = re.compile(pattern[3:])
+                except re.error as e:
+                    raise ValueError(f"Invalid regular expression in signal pattern {pattern}: {e}") from None
+                self.name_regexes.append(regex)
+                self.path_regexes.append(regex)
+            elif pattern.endswith('.*') and not re.search(r'[*?]', pattern[:-2]):
+                self._add_scope(pattern[:-2])
+            elif pattern.endswith('.'):
+                self._add_scope(pattern[:-1])
+            elif '*' in pattern or '?' in pattern:
+                regex = ''.join('.*' if c == '*' else '.' if c == '?' else re.escape(c) for c in pattern)
+                (path_wildcards if '.' in pattern else name_wildcards).append(regex)
+            elif '.' in pattern:
+                self.paths.add(pattern)
+            else:
+                self.names.add(pattern)
+        if name_wildcards:
+            self.name_regexes.append(self._compile(name_wildcards))
+        if path_wildcards:
+            self.path_regexes.append(self._compile(path_wildcards))
+        # 作用域 -> 是否在某个选中的作用域之下
+        self._scope_cache = {}
+
+    @staticmethod
+    def _compile(regexes):
+        """合并由通配符生成的正则（不含标志和分组，可以安全地合并）"""
+        return re.compile('|'.join(f'(?:{regex})' for regex in regexes))
+
+    def _add_scope(self, scope):
+        node = self.scopes
+        for part in scope.split('.'):
+            node = node.setdefault(part, {})
+        node[_END] = True
+
+    def in_scope(self, hier):
+        """hier 是否位于某个选中的作用域之下（结果按作用域缓存）"""
+        selected = self._scope_cache.get(hier)
+        if selected is None:
+            selected = False
+            node = self.scopes
+            for part in hier.split('.') if hier else ():
+                node = node.get(part)
+                if node is None:
+                    break
+                if _END in node:
+                    selected = True
+                    break
+            self._scope_cache[hier] = selected
+        return selected
+
+    def match(self, hier, name):
+        """判断层次为 hier、叶子名为 name 的信号是否被选中"""
+        if name in self.names:
+            return True
+        if self.scopes and self.in_scope(hier):
+            return True
+        if self.paths or self.path_regexes:
+            path = hier + '.' + name if hier else name
+            if path in self.paths:
+                return True
+            if any(regex.fullmatch(path) for regex in self.path_regexes):
+                return True
+        return any(regex.fullmatch(name) for regex in self.name_regexes)
+
+    def __contains__(self, name):
+        """按叶子名（不含层次）判断，用于 reg.list 这类只有信号名的列表"""
+        return self.match('', name)
+
+    def __len__(self):
+        return len(self.patterns)
+
+
+def compile_patterns(patterns):
+    """编译模式列表；已经是 SignalSelector 时直接返回"""
+    if isinstance(patterns, SignalSelector):
+        return patterns
+    return SignalSelector(patterns)
+
+
+def read_pattern_list(list_file):
+    """读取并编译模式列表文件"""
+    with open(list_file, 'r') as f:
+        return SignalSelector(f)
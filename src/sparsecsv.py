@@ -0,0 +1,78 @@
+"""稀疏（只含变化）的激励CSV格式，可代替逐周期写出全部信号的CSV
+
+    #sparse-stimulus 1   格式标记（读取时按它识别格式）
+    Time,Signal,Value
+    0,reset,1            第一个时间点：全部信号的初值（尚无值的信号为 x）
+    0,io_in[3:0],0000
+    10,reset,0           之后每个时间点只写出取值变化的信号
+    20,,                 没有信号变化的时间点只占一行，保留周期
+
+没有信号时第一个时间点同样只占一行。信号的列顺序即初值中出现的顺序。读取时沿用上一时间点的值，得到与普通CSV相同的逐周期输入。
+大多数输入长时间保持不变时，文件大小和读取时间都只与变化数成正比。
+"""
+import csv
+import itertools
+
+MARKER = '#sparse-stimulus 1'
+HEADER = ['Time', 'Signal', 'Value']
+
+
+def is_sparse_csv(path):
+    """判断文件是否为稀疏CSV（按第一行的格式标记判断）"""
+    with open(path, 'rb') as f:
+        return f.readline(64).rstrip(b'\r\n') == MARKER.encode()
+
+
+def write_sparse(output_file, signals, steps, flush=False):
+    """写出稀疏CSV，steps 按时间顺序产生 (time, [(列号, 值)])，与当前值相同的值不写出
+    返回时间点数；flush 为 True 时每个时间点写出后立即刷新"""
+    values = ['x'] * len(signals)
+    count = 0
+    with open(output_file, 'w', newline='') as f:
+        f.write(MARKER + '\n')
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for time, changes in steps:
+            if count == 0:
+                for i, value in changes:
+                    values[i] = value
+                writer.writerows([[time, signal, value] for signal, value in zip(signals, values)]
+                                 or [[time, '', '']])
+            else:
+                rows = []
+                for i, value in changes:
+                    if value != values[i]:
+                        values[i] = value
+                        rows.append([time, signals[i], value])
+                writer.writerows(rows or [[time, '', '']])
+            count += 1
+            if flush:
+                f.flush()
+    return count
+
+
+def read_sparse(path):
+    """读取稀疏CSV，返回 (信号名列表, 变化迭代器)
+    迭代器按时间顺序产生 (time, [(列号, 值)])，第一个时间点包含全部信号的初值"""
+    f = open(path, 'r', newline='')
+    marker = f.readline().rstrip('\r\n')
+    reader = csv.reader(f)
+    if marker != MARKER or next(reader, None) != HEADER:
+        f.close()
+        raise ValueError(f"{path} is not a sparse stimulus CSV")
+    groups = itertools.groupby(reader, key=lambda row: row[0])
+    first = next(groups, None)
+    if first is None:
+        f.close()
+        return [], iter(())
+    time, rows = first
+    snapshot = [(row[1], row[2]) for row in rows if row[1]]
+    signals = [signal for signal, _ in snapshot]
+    columns = {signal: i for i, signal in enumerate(signals)}
+
+    def steps():
+        with f:
+            yield int(time), [(i, value) for i, (_, value) in enumerate(snapshot)]
+            for step_time, rows in groups:
+                yield int(step_time), [(columns[row[1]], row[2]) for row in rows if row[1]]
+    return signals, steps()
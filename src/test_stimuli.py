@@ -1,10 +1,17 @@
 import os
+import re
 import csv
+import json
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import Timer, RisingEdge, FallingEdge
 from cocotb.binary import BinaryValue
 
+import profiling
+import sigselect
+import Verilog_VCD
+from replaydata import SignalReplay, VCDReplay, SignalComparator
+
 import debugpy
 
 # debugpy.listen(("0.0.0.0", 4000))
@@ -13,247 +20,558 @@ import debugpy
 
 max_vpi_bits = 1000
 
-def clean_signal_name_and_get_index(signal_name):
-    """清理信号名称，去除位宽信息，并且获得下标并返回"""
-    # 例如 xx[3] -> xx, 3
-    left_bracket_pos = signal_name.find('[')
-    right_bracket_pos = signal_name.find(']')
-    if left_bracket_pos != -1 and right_bracket_pos != -1:
-        return signal_name[:left_bracket_pos], int(signal_name[left_bracket_pos+1:right_bracket_pos])
-    return signal_name, -1
-
-class SignalReplay:
-    def __init__(self, csv_file):
-        self.csv_file = csv_file
-        self.signals = {}
-        self.timestamps = []
-        self.signal_names = []
-        self._parse_csv()
-
-    def _clean_signal_name(self, signal_name):
-        """清理信号名称，去除位宽信息"""
-        # 找到第一个左中括号的位置
-        bracket_pos = signal_name.find('[')
-        if bracket_pos != -1:
-            # 只返回中括号之前的部分
-            return signal_name[:bracket_pos]
-        return signal_name
-
-    def _parse_csv(self):
-        """解析CSV文件"""
-        with open(self.csv_file, 'r') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            # 清理信号名称，去除位宽信息
-            self.signal_names = [self._clean_signal_name(header) for header in headers[1:]]
-            
-            # 初始化信号字典
-            for signal in self.signal_names:
-                self.signals[signal] = {}
-            
-            # 读取所有数据
-            for row in reader:
-                time = int(row[0])
-                self.timestamps.append(time)
-                for i, value in enumerate(row[1:], 0):
-                    signal_name = self.signal_names[i]
-                    self.signals[signal_name][time] = value
-
-    def get_value_at_time(self, signal_name, time):
-        """获取指定时间点的信号值"""
-        clean_name = self._clean_signal_name(signal_name)
-        return self.signals[clean_name].get(time, None)
-
-class SignalComparator:
-    def __init__(self, csv_file):
-        self.csv_file = csv_file
-        self.signals = {}
-        self.timestamps = []
-        self.signal_names = []
-        self._parse_csv()
-
-    def _clean_signal_name(self, signal_name):
-        """清理信号名称，去除位宽信息"""
-        # 找到第一个右中括号的位置
-        bracket_pos = signal_name.rfind('[')
-        if bracket_pos != -1:
-            # 只返回中括号之前的部分
-            return signal_name[:bracket_pos]
-        return signal_name
-
-    def _parse_csv(self):
-        """解析CSV文件"""
-        with open(self.csv_file, 'r') as f:
-            reader = csv.reader(f)
-            headers = next(reader)
-            # 清理信号名称，去除位宽信息
-            self.signal_names = [self._clean_signal_name(header) for header in headers[1:]]
-            
-            # 初始化信号字典
-            for signal in self.signal_names:
-                self.signals[signal] = {}
-            
-            # 读取所有数据
-            for row in reader:
-                time = int(row[0])
-                self.timestamps.append(time)
-                for i, value in enumerate(row[1:], 0):
-                    signal_name = self.signal_names[i]
-                    self.signals[signal_name][time] = value
-
-    def get_value_at_time(self, signal_name, time):
-        # clean_name = self._clean_signal_name(signal_name)
-        return self.signals[signal_name].get(time, None)
+class ReplayReporter:
+    """重放日志/报告层：
+    verbosity 0 只输出结果，1（默认）输出不匹配信息，2 额外输出每个周期的驱动与匹配跟踪；
+    不匹配记录保存在内存中，测试结束时一次性写出 JSON/CSV 报告；
+    同一信号的不匹配日志最多输出 max_repeats 条"""
+    FIELDS = ['cycle', 'time', 'signal', 'status', 'expected_before', 'got_before', 'expected_after', 'got_after']
+
+    def __init__(self, verbosity=1, max_repeats=10):
+        self.verbosity = verbosity
+        self.max_repeats = max_repeats
+        self.records = []
+        self.repeats = {}
+
+    def trace(self, message):
+        """每个周期的详细跟踪信息，仅在 verbosity >= 2 时输出"""
+        if self.verbosity >= 2:
+            cocotb.log.info(message)
+
+    def info(self, message):
+        if self.verbosity >= 1:
+            cocotb.log.info(message)
+
+    def mismatch(self, cycle, time, signal, status, expected_before, got_before, expected_after, got_after):
+        """记录一次不匹配（status 为 mismatch 或 warning），并按上限输出日志
+        期望值与读回值都以同一位宽的二进制串记录"""
+        expected_before, got_before = same_width(expected_before, got_before)
+        expected_after, got_after = same_width(expected_after, got_after)
+        self.records.append({
+            'cycle': cycle, 'time': time, 'signal': signal, 'status': status,
+            'expected_before': str(expected_before), 'got_before': str(got_before),
+            'expected_after': str(expected_after), 'got_after': str(got_after),
+        })
+        if self.verbosity < 1:
+            return
+        count = self.repeats.get(signal, 0) + 1
+        self.repeats[signal] = count
+        if count <= self.max_repeats:
+            level = 'ERROR' if status == 'mismatch' else 'WARNING'
+            cocotb.log.info(f"[{level}] Signal {signal} {status} at time {time}ns: "
+                            f"before posedge expected {expected_before}, got {got_before}; "
+                            f"after posedge expected {expected_after}, got {got_after}")
+        if count == self.max_repeats:
+            cocotb.log.info(f"[INFO] Further messages for signal {signal} are suppressed, see the mismatch report")
+
+    def write_report(self, path):
+        """写出不匹配报告，按扩展名选择 CSV 或 JSON"""
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+                writer.writeheader()
+                writer.writerows(self.records)
+        else:
+            with open(path, 'w') as f:
+                json.dump({'mismatches': self.records}, f, indent=1)
+
+def to_drive_value(value):
+    """将激励值转换为驱动值：纯二进制串转为整数，含 x/z 的保留为 BinaryValue"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value, 2)
+    except ValueError:
+        return BinaryValue(value)
+
+def resolve_handle(dut, record):
+    """按解析后的信号名（signames.SignalName）取得句柄：数组元素取 base 的第 index 个元素，
+    不存在时返回 None"""
+    if not hasattr(dut, record.base):
+        return None
+    handle = getattr(dut, record.base)
+    if record.index == -1:
+        return handle
+    try:
+        return handle[record.index]
+    except (IndexError, KeyError, TypeError):
+        return None
+
+class DrivePlan:
+    """驱动计划：启动时一次性解析信号句柄、排除时钟并预先转换所有周期的值，
+    每个周期只写入与上一周期相比发生变化的信号；
+    流式重放（VCDReplay）和稀疏CSV不预先展开，改为每个周期读取 replayer.values 并比较原始值"""
+    def __init__(self, dut, replayer, clock_name, reporter=None):
+        self.reporter = reporter or ReplayReporter()
+        self.replayer = replayer
+        self.names = []
+        self.handles = []
+        self.indexes = []
+        self.columns = [] if replayer.values is None else None
+        for i, signal_name in enumerate(replayer.signal_names):
+            record = replayer.names.record(signal_name)
+            handle = resolve_handle(dut, record) if record.base != clock_name else None
+            if handle is None:
+                continue
+            self.names.append(signal_name)
+            self.handles.append(handle)
+            self.indexes.append(i)
+            if self.columns is None:
+                continue
+            # 相同的原始值共享同一个转换结果，之后用 is 判断是否变化
+            cache = {}
+            column = []
+            for time in replayer.timestamps:
+                if replayer.stim is not None:
+                    raw = replayer.get_int_at_time(signal_name, time)
+                else:
+                    raw = replayer.get_value_at_time(signal_name, time)
+                value = cache.get(raw)
+                if value is None:
+                    value = cache[raw] = to_drive_value(raw)
+                column.append(value)
+            self.columns.append(column)
+        self.last_values = [None] * len(self.handles)
+        self.writes = 0
+        self.writes_saved = 0
+
+    def drive(self, cycle):
+        """驱动第 cycle 个周期的输入，只写入变化的信号"""
+        if self.columns is None:
+            self._drive_values(self.replayer.values)
+            return
+        last_values = self.last_values
+        for i, handle in enumerate(self.handles):
+            value = self.columns[i][cycle]
+            if value is last_values[i]:
+                self.writes_saved += 1
+                continue
+            last_values[i] = value
+            handle.value = value
+            self.writes += 1
+            self.reporter.trace(f"Setting {self.names[i]} to {value}")
+
+    def _drive_values(self, values):
+        """按当前输入向量驱动，last_values 保存上一次写入的原始值"""
+        last_values = self.last_values
+        for i, handle in enumerate(self.handles):
+            raw = values[self.indexes[i]]
+            if raw is None or raw == last_values[i]:
+                self.writes_saved += 1
+                continue
+            last_values[i] = raw
+            value = to_drive_value(raw)
+            handle.value = value
+            self.writes += 1
+            self.reporter.trace(f"Setting {self.names[i]} to {value}")
+
+def expected_key(value):
+    """将期望值（二进制字符串）转换为比较键：纯二进制为整数，含 x/z 时为小写字符串"""
+    if value is None:
+        return None
+    try:
+        return int(value, 2)
+    except ValueError:
+        return value.lower()
+
+def actual_key(value):
+    """将仿真器读回的值转换为与 expected_key 相同形式的比较键"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return str(value).lower()
+
+def same_width(*values):
+    """将值统一为小写二进制串，按其中最长者左扩展（最高位为 x/z 时以该位扩展，否则补 0），用于日志和报告
+    None 原样返回"""
+    texts = [None if value is None else str(value).lower() for value in values]
+    width = max((len(text) for text in texts if text is not None), default=0)
+    return [text if not text else text.rjust(width, text[0] if text[0] in 'xz' else '0')
+            for text in texts]
+
+class CompareEntry:
+    """一个被比较的信号：名称、句柄、数组下标以及按时间点预先转换好的期望值"""
+    __slots__ = ('name', 'handle', 'index', 'expected')
+
+    def __init__(self, name, handle, index, expected):
+        self.name = name
+        self.handle = handle
+        self.index = index
+        self.expected = expected  # 时间点 -> 期望值
+
+    def read(self):
+        """读取当前值，数组元素按下标读取"""
+        value = self.handle.value
+        if self.index != -1 and type(value) == list:
+            value = value[self.index]
+        return value
+
+class ComparePlan:
+    """比较计划：启动时把所有比较信号分为寄存器/线网、标量/数组元素，
+    解析句柄并把期望值转换为整数；每个周期只做一次批量读取和整数比较；
+    期望值按比较文件中的时间点索引，不依赖重放激励的时间点（流式重放时事先未知）"""
+    def __init__(self, dut, comparator, reglist, clock_name='clock', reporter=None):
+        self.reporter = reporter or ReplayReporter()
+        # reg.list 中可以使用通配符和正则（见 sigselect）
+        reglist = sigselect.compile_patterns(reglist)
+        skip = {'clock', clock_name}
+        self.regs = []
+        self.wires = []
+        for signal_name in comparator.signal_names:
+            record = comparator.names.record(signal_name)
+            if record.base in skip:
+                continue
+            if record.base in reglist and hasattr(dut, record.base):
+                self.regs.append(self._entry(dut, comparator, record.key, record.base, record.index))
+            elif record.key not in reglist and hasattr(dut, record.key):
+                self.wires.append(self._entry(dut, comparator, record.key, record.key, -1))
+        self.wire_before = []
+        self.reads = 0
+        # 期望值只保存比较键，报告时再从比较文件取原始二进制串
+        self.comparator = comparator
+
+    @staticmethod
+    def _entry(dut, comparator, column, signal_name, index):
+        expected = {time: expected_key(comparator.get_value_at_time(column, time)) for time in comparator.timestamps}
+        return CompareEntry(column, getattr(dut, signal_name), index, expected)
+
+    def _report(self, cycle, entry, time, before, after, before_time, after_time):
+        """根据上升沿前后的比较结果记录不匹配：前后都不匹配为 mismatch，只有一侧不匹配为 warning
+        before_time/after_time 为上升沿前后期望值所在的时间点"""
+        match_before = actual_key(before) == entry.expected.get(before_time)
+        match_after = actual_key(after) == entry.expected[after_time]
+        expected_after = self.comparator.get_value_at_time(entry.name, after_time)
+        if match_before and match_after:
+            if self.reporter.verbosity >= 2:
+                expected_after, after = same_width(expected_after, after)
+                self.reporter.trace(f"[INFO] Signal {entry.name} match before and after posedge of timer at time {time}ns: expected {expected_after}, got {after}")
+            return
+        status = 'warning' if match_before or match_after else 'mismatch'
+        expected_before = self.comparator.get_value_at_time(entry.name, before_time)
+        self.reporter.mismatch(cycle, time, entry.name, status, expected_before, before, expected_after, after)
+
+    def check_before_posedge(self, cycle, time):
+        """上升沿之前：寄存器与当前和 time+5 的期望值比较，并记录线网的值"""
+        self.reporter.trace('[CHECKING REGLIST]')
+        values = [entry.read() for entry in self.regs]
+        self.reads += len(values)
+        for entry, value in zip(self.regs, values):
+            # reg update after posedge
+            expected_next = entry.expected.get(time+5)
+            if expected_next is None:
+                continue
+            self._report(cycle, entry, time, value, value, time, time+5)
+
+        self.reporter.trace('[CHECKING WIRE & Port]')
+        self.wire_before = [entry.read() for entry in self.wires]
+        self.reads += len(self.wires)
+
+    def check_after_posedge(self, cycle, time):
+        """上升沿之后：线网与上升沿前后的读数分别比较"""
+        values = [entry.read() for entry in self.wires]
+        self.reads += len(values)
+        for entry, before, after in zip(self.wires, self.wire_before, values):
+            expected = entry.expected.get(time)
+            if expected is None:
+                continue
+            self._report(cycle, entry, time, before, after, time, time)
+
+def coverage_int(value):
+    """将覆盖向量的值转换为整数，x/z 视为 0"""
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return int(re.sub('[^1]', '0', str(value)) or '0', 2)
+
+def read_cover_bit(dut, test_id):
+    """读取 coverage{id1} 中 id2 对应的覆盖位（按整数取位，不依赖位宽），信号不存在时返回 None"""
+    id1, id2 = test_id.split('-')
+    if not hasattr(dut, f'coverage{id1}'):
+        return None
+    return str(coverage_int(getattr(dut, f'coverage{id1}').value) >> int(id2) & 1)
+
+class CoverageMonitor:
+    """一次读取全部 coverage* 向量（使用实际位宽），可选在每个周期采样，
+    记录每个覆盖位首次置位的周期，并输出本次激励新命中的集合（开始时已置位的位单独列出）"""
+    def __init__(self, dut):
+        self.handles = {}
+        for handle in dut:
+            match = re.fullmatch(r'coverage(\d+)', handle._name)
+            if match:
+                self.handles[int(match.group(1))] = handle
+        # 开始重放时已经置位的位不计为本次新命中
+        self.baseline = {id1: coverage_int(handle.value) for id1, handle in self.handles.items()}
+        self.seen = dict(self.baseline)
+        self.first_hit = {}
+
+    @staticmethod
+    def _bits(value):
+        while value:
+            low = value & -value
+            yield low.bit_length() - 1
+            value ^= low
+
+    def sample(self, cycle, time):
+        """采样所有覆盖向量，记录新置位的位"""
+        for id1, handle in self.handles.items():
+            value = coverage_int(handle.value)
+            new = value & ~self.seen[id1]
+            if new:
+                for bit in self._bits(new):
+                    self.first_hit[f'{id1}-{bit}'] = {'cycle': cycle, 'time': time}
+                self.seen[id1] |= value
+
+    def result(self):
+        """返回本次新命中的集合、开始时已置位的集合、各向量位宽以及首次命中周期"""
+        hits = {}
+        already_set = {}
+        widths = {}
+        for id1, handle in self.handles.items():
+            value = coverage_int(handle.value)
+            hits[f'coverage{id1}'] = list(self._bits(value & ~self.baseline[id1]))
+            already_set[f'coverage{id1}'] = list(self._bits(value & self.baseline[id1]))
+            widths[f'coverage{id1}'] = len(handle)
+            new = value & ~self.seen[id1]
+            for bit in self._bits(new):
+                self.first_hit.setdefault(f'{id1}-{bit}', None)
+        return {'widths': widths, 'hits': hits, 'already_set': already_set, 'first_hit': self.first_hit}
+
+async def reset_dut(dut, clock_name, reset_name, cycles):
+    """在两个激励之间对DUT复位 cycles 个周期"""
+    if not hasattr(dut, reset_name):
+        cocotb.log.info(f"[WARNING] No reset port {reset_name}, replaying without reset")
+        return
+    getattr(dut, reset_name).value = 1
+    for _ in range(cycles):
+        getattr(dut, clock_name).value = 0
+        await Timer(1, units='ns')
+        getattr(dut, clock_name).value = 1
+        await Timer(1, units='ns')
+    getattr(dut, reset_name).value = 0
+
+async def replay_stimulus(dut, csv_file, test_id, clock_name, reporter, comparator=None, reglist=(),
+                          coverage_mode=None, early_exit=False, input_signals=None, profiler=None, follow=None):
+    """重放一个激励文件，返回该激励的覆盖结果
+    coverage_mode 为 'final' 时在结束后读取全部覆盖向量，为 'cycle' 时还在每个周期采样
+    early_exit 为 True 时每个上升沿后检查目标覆盖位，一旦置位立即结束重放
+    给出 input_signals 时 csv_file 为VCD文件，按该信号列表直接流式重放；
+    再给出 follow（Verilog_VCD.Follow）时该VCD可以仍在写入
+    给出 profiler 时分阶段记录：读取激励、构建计划、驱动、比较、覆盖采样和仿真推进"""
+    profiler = profiler or profiling.Profiler(enabled=False)
+    id1, id2 = test_id.split('-')
+    cover_before = read_cover_bit(dut, test_id)
+    monitor = CoverageMonitor(dut) if coverage_mode else None
+    # 目标覆盖位在重放前已经置位时无法判断何时触发，不提前结束
+    target = getattr(dut, f'coverage{id1}') if early_exit and cover_before == '0' else None
+    target_bit = int(id2)
+    fired = None
+
+    # 初始化信号重放器
+    with profiler.stage('load_stimulus'):
+        if input_signals is not None:
+            replayer = VCDReplay(csv_file, input_signals, follow)
+        else:
+            replayer = SignalReplay(csv_file)
+    if profiler:
+        rows = len(replayer.timestamps) if replayer.timestamps is not None else 0
+        profiler.count('load_stimulus', rows=rows, signals=len(replayer.signal_names))
+
+    # 一次性构建驱动计划和比较计划
+    with profiler.stage('plan'):
+        drive_plan = DrivePlan(dut, replayer, clock_name, reporter)
+        if comparator:
+            compare_plan = ComparePlan(dut, comparator, reglist, clock_name, reporter)
+        else:
+            compare_plan = None
+
+    # 遍历时间戳（流式重放VCD时，取下一个时间点的解析计入 read_stimulus）
+    cycles = 0
+    for cycle, time in enumerate(profiler.iterate('read_stimulus', replayer.iter_times())):
+        cycles = cycle + 1
+        reporter.trace(f"[INFO] Time {time}ns: ")
+        with profiler.stage('simulate'):
+            getattr(dut, clock_name).value = 0
+            await Timer(1, units='ns')
+        # if hasattr(dut, f'coverage{id1}[{id2}]'):
+        #     cocotb.log.info(f"Final coverage = {str(dut.getattr(f'coverage{id1}').value[id2])}")
+        
+        # 为每个信号设置对应时间点的值（只驱动变化的信号）
+        with profiler.stage('drive'):
+            drive_plan.drive(cycle)
+
+        
+        if compare_plan:
+            with profiler.stage('compare'):
+                compare_plan.check_before_posedge(cycle, time)
+
+        # 等待1ns
+        with profiler.stage('simulate'):
+            getattr(dut, clock_name).value = 1
+            await Timer(1, units='ns')
+        
+        if compare_plan:
+            with profiler.stage('compare'):
+                compare_plan.check_after_posedge(cycle, time)
+        if coverage_mode == 'cycle':
+            with profiler.stage('coverage'):
+                monitor.sample(cycle, time)
+        if target is not None and coverage_int(target.value) >> target_bit & 1:
+            fired = {'cycle': cycle, 'time': time}
+            break
+
+    # 在时间戳结束后继续访问两次（提前结束时跳过）
+    for extra in range(0 if fired else 2):
+        getattr(dut, clock_name).value = 0
+        await Timer(1, units='ns')
+        getattr(dut, clock_name).value = 1
+        await Timer(1, units='ns')
+        if coverage_mode == 'cycle':
+            monitor.sample(cycles + extra, None)
+
+    reporter.info(f"[INFO] VPI writes: {drive_plan.writes}, saved: {drive_plan.writes_saved}")
+    if profiler:
+        profiler.count('read_stimulus', cycles=cycles)
+        profiler.count('drive', vpi_writes=drive_plan.writes, writes_saved=drive_plan.writes_saved)
+        if compare_plan:
+            profiler.count('compare', vpi_reads=compare_plan.reads)
+        if coverage_mode == 'cycle':
+            profiler.count('coverage', vpi_reads=len(monitor.handles) * (cycles + (0 if fired else 2)))
+
+    result = cover_result(dut, test_id, csv_file, cover_before)
+    if early_exit:
+        result['fired'] = fired
+        # 流式重放时提前结束后不再读取剩余部分，总周期数未知
+        if replayer.timestamps is not None:
+            total = len(replayer.timestamps)
+        else:
+            total = None if fired else cycles
+        result['cycles'] = total
+        if fired and total is not None:
+            skipped = total - fired['cycle'] - 1
+            cocotb.log.info(f"[RESULT] coverage{id1}-{id2} fired at cycle {fired['cycle']} (time {fired['time']}ns), "
+                            f"{skipped} of {total} cycles skipped")
+        elif fired:
+            cocotb.log.info(f"[RESULT] coverage{id1}-{id2} fired at cycle {fired['cycle']} (time {fired['time']}ns), "
+                            f"rest of the VCD skipped")
+        elif target is None:
+            cocotb.log.info(f"[WARNING] coverage{id1}-{id2} cannot be watched, early exit disabled for this stimulus")
+    if monitor:
+        add_coverage(result, monitor)
+    return result
+
+def cover_result(dut, test_id, csv_file, cover_before):
+    """读取并打印目标覆盖位，返回结果字典"""
+    id1, id2 = test_id.split('-')
+    # 打印最终的 
+    result = {'id': test_id, 'csv': csv_file, 'cover': read_cover_bit(dut, test_id), 'cover_before': cover_before}
+    if result['cover'] is not None:
+        cocotb.log.info(f"[RESULT] The cover result of coverage{id1}-{id2} is: {result['cover']}")
+        cocotb.log.info(f"[RESULT] The full value of coverage{id1}-{id2} is: {str(getattr(dut,f'coverage{id1}').value)}")
+        if cover_before == '1':
+            cocotb.log.info(f"[WARNING] coverage{id1}-{id2} was already 1 before this stimulus, it is not cleared by reset")
+    return result
+
+def add_coverage(result, monitor):
+    """把全部覆盖向量的命中集合加入结果"""
+    result['coverage'] = monitor.result()
+    total = sum(len(bits) for bits in result['coverage']['hits'].values())
+    already = sum(len(bits) for bits in result['coverage']['already_set'].values())
+    cocotb.log.info(f"[RESULT] {total} coverage bits newly set over {len(monitor.handles)} coverage vectors, "
+                    f"{already} already set before this stimulus")
+
+async def replay_native(dut, csv_file, test_id, coverage_mode=None, profiler=None):
+    """原生重放（见 native_replay）：激励由生成的外壳通过 $readmemh 在仿真器内部逐周期驱动，
+    这里只等待外壳的 done 并读取覆盖结果，输出与 replay_stimulus 相同的结果字典"""
+    profiler = profiler or profiling.Profiler(enabled=False)
+    cover_before = read_cover_bit(dut, test_id)
+    monitor = CoverageMonitor(dut) if coverage_mode else None
+    with profiler.stage('simulate'):
+        await RisingEdge(dut.done)
+    result = cover_result(dut, test_id, csv_file, cover_before)
+    if monitor:
+        add_coverage(result, monitor)
+    return result
 
 @cocotb.test()
 async def test_stimuli_replay(dut):
-    # 获取CSV文件路径（从环境变量或使用默认值）
-    csv_file = os.environ.get('CSV_FILE', 'input.csv')
-    test_id = os.environ.get('TEST_ID', '0-0')
+    # 获取激励文件路径（从环境变量或使用默认值），多个文件用 os.pathsep 分隔，在同一次仿真中依次重放
+    # 设置 VCD_FILE 时直接重放VCD文件，输入信号取自 INPUTS_FILE；
+    # 设置 VCD_FOLLOW 时VCD可以仍在写入（FOLLOW_TIMEOUT 秒不再增长或 FOLLOW_PID 进程退出即为写完）
+    vcd_files = os.environ.get('VCD_FILE', None)
+    follow = None
+    if vcd_files:
+        csv_files = vcd_files.split(os.pathsep)
+        input_signals = sigselect.read_pattern_list(os.environ.get('INPUTS_FILE', 'input.list'))
+        if os.environ.get('VCD_FOLLOW', '0') == '1':
+            pid = os.environ.get('FOLLOW_PID', None)
+            follow = Verilog_VCD.Follow(float(os.environ.get('FOLLOW_TIMEOUT', Verilog_VCD.FOLLOW_TIMEOUT)),
+                                        int(pid) if pid else None)
+    else:
+        csv_files = os.environ.get('CSV_FILE', 'input.csv').split(os.pathsep)
+        input_signals = None
+    test_ids = os.environ.get('TEST_ID', '0-0').split(os.pathsep)
+    if len(test_ids) == 1:
+        test_ids = test_ids * len(csv_files)
     clock_name = os.environ.get('CLOCK', 'clock')
-    id1 = test_id.split('-')[0]
-    id2 = test_id.split('-')[1]
+    reset_name = os.environ.get('RESET', 'reset')
+    reset_cycles = int(os.environ.get('RESET_CYCLES', '2'))
+    coverage_mode = os.environ.get('COVERAGE_MODE', None)
+    coverage_file = os.environ.get('COVERAGE_FILE', 'coverage_hits.json')
+    early_exit = os.environ.get('EARLY_EXIT', '0') == '1'
     cmpcsv_file = os.environ.get('CMPCSV_FILE', None)
     reglist_file = os.environ.get('REGLIST_FILE', None)
     PWD = os.environ.get('PWD', os.getcwd())
+    report_file = os.environ.get('REPORT_FILE', 'mismatch_report.json')
+    reporter = ReplayReporter(int(os.environ.get('REPLAY_VERBOSITY', '1')),
+                              int(os.environ.get('REPLAY_MAX_REPEATS', '10')))
+    # 设置 PROFILE_FILE 时分阶段记录耗时，写为JSON
+    profile_file = os.environ.get('PROFILE_FILE', None)
+    profiler = profiling.Profiler(enabled=bool(profile_file))
     # get reglist from reglist_file path
     if reglist_file:
-        with open(reglist_file, 'r') as f:
-            reglist = [line.strip() for line in f if line.strip()]
+        reglist = sigselect.read_pattern_list(reglist_file)
     else:
         reglist = []
 
-
-    # 初始化信号重放器
-    replayer = SignalReplay(os.path.join(PWD,csv_file))
     if cmpcsv_file!=None:
-        comparator = SignalComparator(cmpcsv_file)
+        with profiler.stage('load_compare'):
+            comparator = SignalComparator(cmpcsv_file)
     else:
         comparator = None
+    if comparator and len(csv_files) > 1:
+        cocotb.log.info("[WARNING] The comparison CSV only applies to the first stimulus")
 
-    # 遍历时间戳
-    for time in replayer.timestamps:
-        cocotb.log.info(f"[INFO] Time {time}ns: ")
-        getattr(dut, clock_name).value = 0
-        await Timer(1, units='ns')
-        # if hasattr(dut, f'coverage{id1}[{id2}]'):
-        #     cocotb.log.info(f"Final coverage = {str(dut.getattr(f'coverage{id1}').value[id2])}")
-        
-        # 为每个信号设置对应时间点的值
-        for signal_name in replayer.signal_names:
-            if hasattr(dut, signal_name) and signal_name != clock_name:
-                value = replayer.get_value_at_time(signal_name, time)
-                signal = getattr(dut, signal_name)
-                
-                # 设置信号值
-                cocotb.log.info(f"Setting {signal_name} to {value}")
-                signal.value = BinaryValue(value)
-
-        
-        if comparator:
-            cocotb.log.info('[CHECKING REGLIST]')
-            dict_mismtach_regs = {}
-            dict_match_regs = {}
-            # 检查每个寄存器的值
-            for _signal_name in comparator.signal_names:
-                signal_name, index = clean_signal_name_and_get_index(_signal_name)
-                if hasattr(dut, signal_name) and signal_name != 'clock' and signal_name in reglist:
-                    if index != -1:
-                        expected_value = comparator.get_value_at_time(signal_name + f'[{str(index)}]', time)
-                    else:
-                        expected_value = comparator.get_value_at_time(signal_name, time)
-                    signal = getattr(dut, signal_name)
-                    if type(signal.value) == list and index != -1:
-                        if signal.value[index] != BinaryValue(expected_value):
-                            dict_mismtach_regs[f"{signal_name}[{index}]"] = (expected_value, signal.value[index])
-                        else:
-                            dict_match_regs[f"{signal_name}[{index}]"] = (expected_value, signal.value[index])
-                    elif signal.value != BinaryValue(expected_value):
-                        dict_mismtach_regs[signal_name] = (expected_value, signal.value)
+    results = []
+    if os.environ.get('REPLAY_BACKEND', 'cocotb') == 'native':
+        # 外壳只重放一个激励，时钟和输入都由外壳驱动
+        cocotb.log.info(f"[INFO] Replaying {csv_files[0]} natively")
+        results.append(await replay_native(dut, os.path.join(PWD, csv_files[0]), test_ids[0], coverage_mode,
+                                           profiler))
+    else:
+        for i, (csv_file, test_id) in enumerate(zip(csv_files, test_ids)):
+            if i > 0:
+                await reset_dut(dut, clock_name, reset_name, reset_cycles)
+            cocotb.log.info(f"[INFO] Replaying {csv_file} ({i+1}/{len(csv_files)})")
+            results.append(await replay_stimulus(dut, os.path.join(PWD, csv_file), test_id, clock_name, reporter,
+                                                 comparator if i == 0 else None, reglist, coverage_mode,
+                                                 early_exit, input_signals, profiler, follow))
 
-        
-            for _signal_name in comparator.signal_names:
-                signal_name, index = clean_signal_name_and_get_index(_signal_name)
-                if hasattr(dut, signal_name) and signal_name != 'clock' and signal_name in reglist:
-                    if index != -1:
-                        expected_value = comparator.get_value_at_time(signal_name + f'[{str(index)}]', time+5) # reg update after posedge
-                    else:
-                        expected_value = comparator.get_value_at_time(signal_name, time+5) # reg update after posedge
-                    signal = getattr(dut, signal_name)
-                    if type(signal.value) == list and index != -1: # checking a list
-                        cocotb.log.info(f"[INFO] Signal {signal_name} is a list, We checking the value accroding to the index")
-                        if signal.value[index] != BinaryValue(expected_value) and signal_name in dict_mismtach_regs:
-                            cocotb.log.info(f"[ERROR] Signal {signal_name}[{index}] mismatch before the time {time}ns: expected {dict_mismtach_regs[f'{signal_name}[{index}]'][0]}, got {dict_mismtach_regs[f'{signal_name}[{index}]'][1]}")
-                            cocotb.log.info(f"[ERROR] Signal {signal_name}[{index}] mismatch after time {time}ns: expected {expected_value}, got {signal.value[index]}")
-                        else:
-                            cocotb.log.info(f"[INFO] Signal {signal_name}[{index}] match before the time {time}ns")
-                            cocotb.log.info(f"[INFO] Signal {signal_name}[{index}] match after time {time}ns")
-                    elif signal.value != BinaryValue(expected_value) and signal_name in dict_mismtach_regs:
-                        cocotb.log.info(f"[ERROR] Signal {signal_name} mismatch before the time {time}ns: expected {dict_mismtach_regs[signal_name][0]}, got {dict_mismtach_regs[signal_name][1]}")
-                        cocotb.log.info(f"[ERROR] Signal {signal_name} mismatch after time {time}ns: expected {expected_value}, got {signal.value}")
-                    elif signal.value == BinaryValue(expected_value) and signal_name in dict_match_regs:
-                        cocotb.log.info(f"[INFO] Signal {signal_name} match before and after posedge of timer at time {time}ns: expected {expected_value}, got {signal.value}")
-                    elif signal.value != BinaryValue(expected_value) and signal_name in dict_match_regs:
-                        cocotb.log.info(f'[WARNING] Mismatch may happen, please check the signal {signal_name} carefully')
-                        cocotb.log.info(f'[INFO] Signal {signal_name} before posedge of timer at time {time}ns: expected {dict_match_regs[signal_name][0]}, got {dict_match_regs[signal_name][1]}')
-                        cocotb.log.info(f"[INFO] Signal {signal_name} after posedge of timer at time {time}ns: expected {expected_value}, got {signal.value}")
-                    elif signal.value == BinaryValue(expected_value) and signal_name in dict_mismtach_regs:
-                        cocotb.log.info(f"[Warning] mismatch may happen, please check the signal {signal_name} carefully")
-                        cocotb.log.info(f"[INFO] Signal {signal_name} mismatch before the time {time}ns: expected {dict_mismtach_regs[signal_name][0]}, got {dict_mismtach_regs[signal_name][1]}")
-                        cocotb.log.info(f"[INFO] Signal {signal_name} match after time {time}ns: expected {expected_value}, got {signal.value}")
-
-            cocotb.log.info('[CHECKING WIRE & Port]')
-            dict_mismtach_wires = {}
-            dict_match_wires = {}
-            for signal_name in comparator.signal_names:
-                if hasattr(dut, signal_name) and signal_name != 'clock' and signal_name not in reglist:
-                    expected_value = comparator.get_value_at_time(signal_name, time)
-                    signal = getattr(dut, signal_name)
-                    if signal.value != BinaryValue(expected_value):
-                        dict_mismtach_wires[signal_name] = (expected_value, signal.value)
-                        # cocotb.log.info(f"Signal {signal_name} mismatch at time {time}ns: expected {expected_value}, got {signal.value}")
-                    else:
-                        dict_match_wires[signal_name] = (expected_value, signal.value)
-
-            
+    if coverage_mode:
+        with open(os.path.join(PWD, coverage_file), 'w') as f:
+            json.dump({'stimuli': [{'id': r['id'], 'csv': r['csv'], **r['coverage']} for r in results]}, f, indent=1)
+        cocotb.log.info(f"[INFO] Coverage hits written to {coverage_file}")
 
-        # 等待1ns
-        getattr(dut, clock_name).value = 1
-        await Timer(1, units='ns')
-        
-        if comparator:
-            for signal_name in comparator.signal_names:
-                if hasattr(dut, signal_name) and signal_name != 'clock' and signal_name not in reglist:
-                    expected_value = comparator.get_value_at_time(signal_name, time)
-                    signal = getattr(dut, signal_name)
-                    if signal.value != BinaryValue(expected_value) and signal_name in dict_mismtach_wires:
-                        if type(dict_mismtach_wires[signal_name][0]) != list and type(dict_mismtach_wires[signal_name][1])!=list and type(signal.value) != list:
-                            cocotb.log.info(f"[ERROR] Signal {signal_name} mismtach before the time {time}ns: expected {dict_mismtach_wires[signal_name][0]}, got {dict_mismtach_wires[signal_name][1]}")
-                            cocotb.log.info(f"[ERROR] Signal {signal_name} mismatch after time {time}ns: expected {expected_value}, got {signal.value}")
-                        else:
-                            cocotb.log.info(f"[INFO] Signal {signal_name} mismtach before the time {time}ns")
-                            cocotb.log.info(f"[INFO] Signal {signal_name} mismatch after time {time}ns")
-                    elif signal.value == BinaryValue(expected_value) and signal_name in dict_match_wires:
-                        cocotb.log.info(f'[INFO] Signal {signal_name} match before and after posedge of timer at time {time}ns: expected {dict_match_wires[signal_name][0]}, got {dict_match_wires[signal_name][1]}')
-                    elif signal.value != BinaryValue(expected_value) and signal_name in dict_match_wires:
-                        cocotb.log.info(f'[WARNING] Mismatch may happen, please check the signal {signal_name} carefully')
-                        cocotb.log.info(f'[INFO] Signal {signal_name} before posedge of timer at time {time}ns: expected {dict_match_wires[signal_name][0]}, got {dict_match_wires[signal_name][1]}')
-                        cocotb.log.info(f"[INFO] Signal {signal_name} after posedge of timer at time {time}ns: expected {expected_value}, got {signal.value}")
-                    elif signal.value == BinaryValue(expected_value) and signal_name in dict_mismtach_wires:
-                        cocotb.log.info(f"[Warning] mismatch may happen, please check the signal {signal_name} carefully")
-                        cocotb.log.info(f"[INFO] Signal {signal_name} mismatch before the time {time}ns: expected {dict_mismtach_wires[signal_name][0]}, got {dict_mismtach_wires[signal_name][1]}")
-                        cocotb.log.info(f"[INFO] Signal {signal_name} match after time {time}ns: expected {expected_value}, got {signal.value}")
-        
-        
+    if comparator:
+        reporter.info(f"[INFO] {len(reporter.records)} mismatches/warnings recorded")
+        reporter.write_report(os.path.join(PWD, report_file))
+        reporter.info(f"[INFO] Mismatch report written to {report_file}")
 
-    # 在时间戳结束后继续访问两次
-    for _ in range(2):
-        getattr(dut, 'clock').value = 0
-        await Timer(1, units='ns')
-        getattr(dut, 'clock').value = 1
-        await Timer(1, units='ns')
+    # 供回归脚本读取的结果文件
+    result_file = os.environ.get('RESULT_FILE', None)
+    if result_file:
+        with open(result_file, 'w') as f:
+            json.dump(results[0] if len(results) == 1 else {'results': results}, f)
 
-    # 打印最终的 
-    if hasattr(dut, f'coverage{id1}'):
-        cocotb.log.info(f"[RESULT] The cover result of coverage{id1}-{id2} is: {str(getattr(dut,f'coverage{id1}').value[1000-int(id2)])}")
-        cocotb.log.info(f"[RESULT] The full value of coverage{id1}-{id2} is: {str(getattr(dut,f'coverage{id1}').value)}")
\ No newline at end of file
+    if profiler:
+        profiler.write(profile_file, stimuli=csv_files, backend=os.environ.get('REPLAY_BACKEND', 'cocotb'))
+        cocotb.log.info(f"[INFO] Replay profile written to {profile_file}")
@@ -1,8 +1,18 @@
 import Verilog_VCD
+import stimfile
+import sigselect
+import sparsecsv
+import profiling
 import argparse
 import sys
+import os
 import csv
-from collections import defaultdict
+import json
+import glob
+import heapq
+import itertools
+import time as _time
+from concurrent.futures import ProcessPoolExecutor
 
 
 def read_input_list(input_list_file):
@@ -10,9 +20,20 @@ def read_input_list(input_list_file):
     with open(input_list_file, 'r') as f:
         return [line.strip() for line in f if line.strip()]
 
-def parse_vcd_signals(vcd_file, signal_list, is_all_signals=False):
-    """解析VCD文件中指定信号的值"""
-    vcd_data = Verilog_VCD.parse_vcd(vcd_file)
+def parse_vcd_signals(vcd_file, signal_list, is_all_signals=False, compact=False, use_index=False,
+                      start=None, end=None, last=None, hiers=None, counts=None):
+    """解析VCD文件中指定信号的值
+    compact=True 时使用紧凑的 Waveform 存储（导出全部信号时节省内存）
+    use_index=True 时复用（或生成）VCD头部索引，跳过 $scope/$var 的重复解析
+    start/end/last 只提取对应的时间窗口（最后 last 个时间点），通过时间索引直接定位
+    signal_list 中的每一项都是选择模式（见 sigselect），在解析 $var 时即完成过滤，
+    未选中的信号不会分配任何存储；CSV 的列名仍为叶子名
+    给出 hiers（dict）时记录每个结果信号的层次路径
+    给出 counts（dict）时在解析的同时统计读取的行数和字节数（lines、bytes）"""
+    selector = None if is_all_signals else sigselect.compile_patterns(signal_list)
+    vcd_data = Verilog_VCD.parse_vcd(vcd_file, compact=compact, use_index=use_index,
+                                     start=start, end=end, last=last,
+                                     select=selector.match if selector else None, counts=counts)
     
     # 获取时间刻度
     timescale = Verilog_VCD.get_timescale()
@@ -25,91 +46,413 @@ def parse_vcd_signals(vcd_file, signal_list, is_all_signals=False):
     for code, data in vcd_data.items():
         for net in data['nets']:
             signal_name = f"{net['name']}"
-            if signal_name in signal_list or is_all_signals:
+            # 同一个code可能对应多个信号，只保留被选中的
+            if is_all_signals or selector.match(net['hier'], signal_name):
                 # 获取信号的时间-值对
                 if 'tv' in data:
                     results[signal_name] = data['tv']
+                    if hiers is not None:
+                        hiers[signal_name] = net['hier']
     
     return results, timescale, endtime
 
-def organize_by_cycle(results):
-    """将结果按周期组织"""
-    cycle_data = defaultdict(dict)
-    all_times = set()
-    
-    # 收集所有时间点
-    for signal_name, tv_pairs in results.items():
-        for time, value in tv_pairs:
-            all_times.add(time)
-    
-    # 按时间排序
-    sorted_times = sorted(all_times)
-    
-    # 对每个信号，找到每个时间点的值
-    for signal_name, tv_pairs in results.items():
-        current_value = 'x'  # 默认值
-        tv_index = 0
-        
-        for time in sorted_times:
-            # 更新当前值
-            while tv_index < len(tv_pairs) and tv_pairs[tv_index][0] <= time:
-                current_value = tv_pairs[tv_index][1]
-                tv_index += 1
-            
-            cycle_data[time][signal_name] = current_value
-    
-    return cycle_data, sorted_times
-
-def export_to_csv(cycle_data, sorted_times, signal_list, output_file):
-    """导出数据到CSV文件"""
-    # 获取所有信号名称
-    all_signals = set()
-    for time_data in cycle_data.values():
-        all_signals.update(time_data.keys())
-    all_signals = sorted(all_signals)  # 排序以保持一致的列顺序
-    
+def iter_cycle_changes(results, signals):
+    """按时间顺序流式产生每个时间点的 (time, [(列号, 值)])，只含在该时间点有记录的信号
+    （值可能与之前相同）。用堆对各信号的变化列表做多路归并，内存只与信号数量成正比"""
+    positions = [0] * len(signals)
+    tv_lists = [results[signal] for signal in signals]
+    heap = [(tv_pairs[0][0], i) for i, tv_pairs in enumerate(tv_lists) if len(tv_pairs)]
+    heapq.heapify(heap)
+
+    while heap:
+        time = heap[0][0]
+        changes = []
+        # 取出所有在该时间点变化的信号
+        while heap and heap[0][0] == time:
+            _, i = heapq.heappop(heap)
+            tv_pairs = tv_lists[i]
+            pos = positions[i]
+            while pos < len(tv_pairs) and tv_pairs[pos][0] <= time:
+                pos += 1
+            changes.append((i, tv_pairs[pos-1][1]))
+            positions[i] = pos
+            if pos < len(tv_pairs):
+                heapq.heappush(heap, (tv_pairs[pos][0], i))
+        yield time, changes
+
+def clock_edges(tv_pairs, edge='posedge'):
+    """由时钟的变化列表得到 posedge/negedge 的时间列表
+    同一时间点的多次变化只看最后的值（零宽毛刺不算边沿）；初值按 x 处理，
+    因此在时间 0 变为 1 也算一个上升沿"""
+    level = '1' if edge == 'posedge' else '0'
+    edges = []
+    last = 'x'
+    for k, (time, value) in enumerate(tv_pairs):
+        if k + 1 < len(tv_pairs) and tv_pairs[k+1][0] == time:
+            continue
+        if value == level and last != level:
+            edges.append(time)
+        last = value
+    return edges
+
+def iter_sampled_changes(results, signals, edges):
+    """只在时钟边沿采样：每个边沿恰好产生一个 (time, [(列号, 值)])，
+    包含上一个边沿之后到该边沿（含同一时间点的变化）之间每个信号的最后取值。
+    与时钟变化列表做归并，边沿之间的毛刺和另一边沿上的变化不会产生额外的行"""
+    steps = iter_cycle_changes(results, signals)
+    step = next(steps, None)
+    for edge_time in edges:
+        pending = {}
+        while step is not None and step[0] <= edge_time:
+            pending.update(step[1])
+            step = next(steps, None)
+        yield edge_time, list(pending.items())
+
+def iter_steps(results, signals, edges=None):
+    """每个时间点（给出 edges 时为每个时钟边沿）的变化"""
+    if edges is None:
+        return iter_cycle_changes(results, signals)
+    return iter_sampled_changes(results, signals, edges)
+
+def carry_forward(steps, count):
+    """把 (time, [(列号, 值)]) 变为 (time, values)，未变化的信号沿用之前的值
+    values 在下一次迭代时会被原地更新"""
+    values = ['x'] * count  # 默认值
+    for time, changes in steps:
+        for i, value in changes:
+            values[i] = value
+        yield time, values
+
+def iter_cycle_rows(results, signals, edges=None):
+    """按时间顺序流式产生每个时间点（或每个时钟边沿）的 (time, values)
+    values 按 signals 的顺序排列，且在下一次迭代时会被原地更新"""
+    return carry_forward(iter_steps(results, signals, edges), len(signals))
+
+def stream_to_csv(results, output_file, edges=None):
+    """单遍归并并直接写出CSV，输出与原来的两遍转换（见 benchmark 中的基线实现）一致，返回行数
+    给出 edges（clock_edges）时每个时钟边沿一行"""
+    signals = sorted(results)  # 排序以保持一致的列顺序
+    return write_csv_rows(output_file, signals, iter_cycle_rows(results, signals, edges))
+
+def write_csv_rows(output_file, signals, rows, flush=False):
+    """写出CSV，rows 为 (time, values) 的迭代器，返回行数
+    flush 为 True 时每行写出后立即刷新（边写边转换时供下游读取）"""
     with open(output_file, 'w', newline='') as f:
         writer = csv.writer(f)
         
-        # 写入表头
-        header = ['Time'] + all_signals
-        writer.writerow(header)
+        first = next(rows, None)
+        # 没有任何时间点时只有 Time 一列
+        writer.writerow(['Time'] + (signals if first else []))
+        if first is None:
+            return 0
         
-        # 写入每个时间点的数据
-        for time in sorted_times:
-            row = [time]
-            for signal in all_signals:
-                row.append(cycle_data[time].get(signal, 'x'))
-            writer.writerow(row)
+        writer.writerow([first[0]] + first[1])
+        count = 1
+        for time, values in rows:
+            writer.writerow([time] + values)
+            count += 1
+            if flush:
+                f.flush()
+    return count
+
+def stream_to_bin(results, output_file, edges=None):
+    """单遍归并并直接写出二进制激励文件（见 stimfile），返回行数"""
+    signals = sorted(results)
+    widths = [stimfile.signal_width(signal, (value for _, value in results[signal])) for signal in signals]
+    return stimfile.write_stimulus(output_file, signals, widths, iter_cycle_rows(results, signals, edges))
+
+def stream_to_sparse(results, output_file, edges=None):
+    """单遍归并并写出只含变化的稀疏CSV（见 sparsecsv），返回行数（时间点数）"""
+    signals = sorted(results)
+    return sparsecsv.write_sparse(output_file, signals, iter_steps(results, signals, edges))
+
+# 输出格式 -> 写出函数
+WRITERS = {
+    'csv': stream_to_csv,
+    'bin': stream_to_bin,
+    'sparse': stream_to_sparse,
+}
+
+# 各输出格式的默认扩展名（输出模板中的 {ext}）
+EXTENSIONS = {
+    'csv': 'csv',
+    'bin': 'stim',
+    'sparse': 'sparse.csv',
+}
+
+# 批量模式按这些扩展名查找VCD文件（压缩文件按内容识别，见 Verilog_VCD.open_vcd）
+VCD_SUFFIXES = ('.vcd', '.vcd.gz', '.vcd.xz', '.vcd.zst')
+
+def convert_vcd(vcd_file, input_signals, output_file, output_format='csv', profiler=None,
+                clock=None, edge='posedge', **parse_options):
+    """将单个VCD文件转换为激励文件（CSV或二进制），返回 (timescale, endtime)
+    parse_options 透传给 parse_vcd_signals（compact、use_index、start、end、last）
+    给出 clock（时钟的信号名，同CSV列名）时只在时钟的 edge 边沿采样，每个周期恰好一行；
+    时钟只有在 input_signals 也选中它时才作为一列输出
+    给出 profiler（profiling.Profiler）时记录解析和写出两个阶段"""
+    profiler = profiler or profiling.Profiler(enabled=False)
+    patterns = list(input_signals) + ([clock] if clock else [])
+
+    # 解析VCD文件
+    with profiler.stage('parse_vcd'):
+        hiers = {}
+        # 读取的行数和字节数在解析的同时统计，不再次读取文件
+        counts = {} if profiler else None
+        results, timescale, endtime = parse_vcd_signals(vcd_file, patterns, is_all_signals=False,
+                                                        hiers=hiers, counts=counts, **parse_options)
+    if profiler:
+        profiler.count('parse_vcd', lines=counts.get('lines', 0), bytes=counts.get('bytes', 0),
+                       signals=len(results), value_changes=sum(len(tv) for tv in results.values()))
+
+    edges = None
+    if clock:
+        if clock not in results:
+            raise ValueError(f"Clock {clock} not found in {vcd_file}")
+        with profiler.stage('clock_edges') as counts:
+            edges = clock_edges(results[clock], edge)
+            counts['edges'] = len(edges)
+        # 按时钟信号的层次路径判断，input_signals 可以用层次路径或作用域选中它
+        if not sigselect.compile_patterns(input_signals).match(hiers[clock], clock):
+            del results[clock]
+    
+    # 按周期归并并导出
+    with profiler.stage(f'write_{output_format}'):
+        rows = WRITERS[output_format](results, output_file, edges)
+    if profiler:
+        profiler.count(f'write_{output_format}', rows=rows, bytes=os.path.getsize(output_file))
+    return timescale, endtime
+
+def stream_columns(vcd_file, input_signals, follow=None):
+    """只读取VCD头部，按选择模式确定输出列（与 parse_vcd_signals 相同：列名为叶子名，
+    按名称排序，同名信号以最后一个为准）
+    返回 (列名列表, code -> [列号], 每列的位宽)"""
+    selector = sigselect.compile_patterns(input_signals)
+    nets = {}
+    for code, data in Verilog_VCD.parse_vcd(vcd_file, only_sigs=1, select=selector.match, follow=follow).items():
+        for net in data['nets']:
+            if selector.match(net['hier'], net['name']):
+                nets[net['name']] = (code, int(net['size']))
+    signals = sorted(nets)
+    columns = {}
+    for i, signal in enumerate(signals):
+        columns.setdefault(nets[signal][0], []).append(i)
+    widths = [max(stimfile.signal_width(signal), nets[signal][1]) for signal in signals]
+    return signals, columns, widths
+
+def iter_stream_changes(vcd_file, columns, follow=None):
+    """流式读取VCD（见 Verilog_VCD.iter_vcd_steps），产生 (time, [(列号, 值)])
+    与 iter_cycle_changes 相同：每列只保留该时间点的最后取值，按列号排序"""
+    for time, changes in Verilog_VCD.iter_vcd_steps(vcd_file, columns, follow=follow):
+        latest = {}
+        for code, value in changes:
+            for i in columns[code]:
+                latest[i] = value
+        yield time, sorted(latest.items())
+
+def sample_stream(steps, clock_column, edge='posedge'):
+    """流式的时钟采样，与 iter_sampled_changes 相同：每个边沿一行，包含上一个边沿之后
+    到该边沿（含）之间的变化；时钟是第 clock_column 列，不输出"""
+    level = '1' if edge == 'posedge' else '0'
+    last = 'x'
+    pending = {}
+    for time, changes in steps:
+        clock = last
+        for i, value in changes:
+            if i == clock_column:
+                clock = value
+            else:
+                pending[i] = value
+        if clock == level and last != level:
+            yield time, list(pending.items())
+            pending = {}
+        last = clock
+
+def follow_vcd(vcd_file, input_signals, output_file, output_format='csv', follow=None,
+               clock=None, edge='posedge', profiler=None):
+    """边写边转换：VCD仍在写入时逐个时间点读取，每得到一行就写出并刷新，
+    VCD写完（见 Verilog_VCD.Follow）后结束，返回行数
+    输出与 convert_vcd 相同；需要完整文件的 --index/--start/--end/--last 不可用"""
+    profiler = profiler or profiling.Profiler(enabled=False)
+    follow = follow or Verilog_VCD.Follow()
+    with profiler.stage('read_header'):
+        signals, columns, widths = stream_columns(vcd_file, input_signals, follow)
+        steps_columns = columns
+        if clock:
+            # 时钟作为不输出的最后一列参与归并
+            _, clock_columns, _ = stream_columns(vcd_file, [clock], follow)
+            if not clock_columns:
+                raise ValueError(f"Clock {clock} not found in {vcd_file}")
+            steps_columns = {code: list(cols) for code, cols in columns.items()}
+            for code in clock_columns:
+                steps_columns.setdefault(code, []).append(len(signals))
+
+    steps = iter_stream_changes(vcd_file, steps_columns, follow)
+    # 输出文件在VCD头部解析完、读到第一个时间点之后才创建
+    first = next(steps, None)
+    steps = itertools.chain([first] if first is not None else [], steps)
+    if clock:
+        steps = sample_stream(steps, len(signals), edge)
+    with profiler.stage(f'follow_{output_format}') as counts:
+        if output_format == 'sparse':
+            rows = sparsecsv.write_sparse(output_file, signals, steps, flush=True)
+        elif output_format == 'bin':
+            rows = stimfile.write_stimulus(output_file, signals, widths, carry_forward(steps, len(signals)), flush=True)
+        else:
+            rows = write_csv_rows(output_file, signals, carry_forward(steps, len(signals)), flush=True)
+        counts['rows'] = rows
+    return rows
+
+def find_vcd_files(batch):
+    """根据目录或通配符查找需要批量转换的VCD文件"""
+    if os.path.isdir(batch):
+        return sorted(path for suffix in VCD_SUFFIXES for path in glob.glob(os.path.join(batch, '*' + suffix)))
+    return sorted(glob.glob(batch))
+
+def batch_output_path(vcd_file, output_pattern, output_format='csv'):
+    """根据输出模板生成输出路径
+    支持 {dir}（VCD所在目录）、{name}（文件名）、{stem}（去掉 .vcd 或 .vcd.gz 等后缀的文件名）
+    以及 {ext}（输出格式的扩展名，见 EXTENSIONS）"""
+    name = os.path.basename(vcd_file)
+    stem = name
+    for suffix in VCD_SUFFIXES:
+        if name.endswith(suffix):
+            stem = name[:-len(suffix)]
+            break
+    return output_pattern.format(dir=os.path.dirname(vcd_file) or '.', name=name, stem=stem,
+                                 ext=EXTENSIONS[output_format])
+
+def _convert_task(vcd_file, input_signals, output_file, output_format, parse_options, profile=False):
+    """进程池中的单个转换任务，异常不向外抛出，而是记录在结果中
+    profile 为 True 时结果中带有该文件的性能记录"""
+    start = _time.perf_counter()
+    status, error = 'ok', ''
+    profiler = profiling.Profiler(enabled=profile)
+    try:
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        convert_vcd(vcd_file, input_signals, output_file, output_format, profiler, **parse_options)
+    except Exception as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+    record = {
+        'vcd': vcd_file,
+        'output': output_file,
+        'status': status,
+        'seconds': f"{_time.perf_counter() - start:.3f}",
+        'error': error,
+    }
+    if profile:
+        record['profile'] = profiler.record(vcd=vcd_file, output=output_file, format=output_format)
+    return record
+
+def convert_batch(vcd_files, input_signals, output_pattern, jobs=None, summary_file=None,
+                  output_format='csv', parse_options=None, profile=False):
+    """用进程池批量转换多个VCD文件，单个文件失败不影响其他文件
+    返回每个文件的结果列表，并可写出汇总CSV"""
+    tasks = [(vcd_file, batch_output_path(vcd_file, output_pattern, output_format)) for vcd_file in vcd_files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(_convert_task, vcd_file, input_signals, output_file, output_format, parse_options or {},
+                               profile)
+                   for vcd_file, output_file in tasks]
+        summary = []
+        for future in futures:
+            record = future.result()
+            summary.append(record)
+            print(f"[{record['status'].upper()}] {record['vcd']} -> {record['output']} ({record['seconds']}s) {record['error']}".rstrip())
+    
+    if summary_file:
+        with open(summary_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['vcd', 'output', 'status', 'seconds', 'error'], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(summary)
+    return summary
 
 def main():
     # 设置命令行参数
     parser = argparse.ArgumentParser(description='Parse VCD file for specific inputs')
-    parser.add_argument('--vcd', required=True, help='Path to VCD file')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--vcd', help='Path to VCD file (may be gzip, xz or zstd compressed)')
+    source.add_argument('--batch', help='Directory or glob of VCD files to convert in batch mode')
     parser.add_argument('--inputs', required=True, help='Path to input list file')
-    parser.add_argument('--output', default='output.csv', help='Path to output CSV file')
+    parser.add_argument('--output', default=None,
+                        help='Path to output file (default: output.csv, output.stim or output.sparse.csv by --format)')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help='Output format: csv, bin for the memory-mappable binary stimulus format, '
+                             'or sparse for a CSV of value changes only')
+    parser.add_argument('--output-pattern', default='{dir}/{stem}.{ext}',
+                        help='Batch mode output path pattern, with {dir}, {name}, {stem} and {ext} '
+                             '(extension of --format) placeholders')
+    parser.add_argument('--jobs', type=int, default=None, help='Batch mode worker processes (default: CPU count)')
+    parser.add_argument('--summary', default=None, help='Batch mode summary CSV file')
+    parser.add_argument('--index', action='store_true', help='Reuse or create a header index (<vcd>.idx) next to each VCD file')
+    parser.add_argument('--compact', action='store_true',
+                        help='Keep the parsed values in compact arrays (less memory for many signals, slightly slower)')
+    parser.add_argument('--start', type=int, default=None, help='Only export from this time on')
+    parser.add_argument('--end', type=int, default=None, help='Only export up to this time')
+    parser.add_argument('--last', type=int, default=None, help='Only export the last N cycles (time steps)')
+    parser.add_argument('--clock', default=None,
+                        help='Sample the signals only at the edges of this clock (its signal name), one row per cycle')
+    parser.add_argument('--edge', choices=['posedge', 'negedge'], default='posedge', help='Clock edge sampled with --clock')
+    parser.add_argument('--profile', default=None, help='Write per-stage time, memory and counts as JSON to this file')
+    parser.add_argument('--follow', action='store_true',
+                        help='Convert the VCD while it is still being written, writing each row as soon as it is complete')
+    parser.add_argument('--follow-timeout', type=float, default=Verilog_VCD.FOLLOW_TIMEOUT,
+                        help='With --follow, the VCD is finished once it has not grown for this many seconds')
+    parser.add_argument('--follow-pid', type=int, default=None,
+                        help='With --follow, the VCD is finished once this (writer) process has exited')
     
     args = parser.parse_args()
+    if args.output is None:
+        args.output = f'output.{EXTENSIONS[args.format]}'
+    if args.last is not None and args.last < 1:
+        parser.error('--last must be at least 1')
+    if args.follow and (args.batch or args.index or args.start is not None or args.end is not None
+                        or args.last is not None):
+        parser.error('--follow converts one --vcd and cannot be used with --index, --start, --end or --last')
+    if args.follow and os.path.exists(args.vcd) and Verilog_VCD.vcd_compression(args.vcd) is not None:
+        parser.error('--follow needs a plain (uncompressed) --vcd')
     
     try:
         # 读取输入列表
         input_signals = read_input_list(args.inputs)
+        parse_options = {'use_index': args.index, 'compact': args.compact,
+                         'start': args.start, 'end': args.end, 'last': args.last,
+                         'clock': args.clock, 'edge': args.edge}
         
-        # 解析VCD文件
-        results, timescale, endtime = parse_vcd_signals(args.vcd, input_signals, is_all_signals=False)
-        
-        # 按周期组织数据
-        cycle_data, sorted_times = organize_by_cycle(results)
+        if args.batch:
+            vcd_files = find_vcd_files(args.batch)
+            if not vcd_files:
+                raise FileNotFoundError(f"No VCD files found for {args.batch}")
+            summary = convert_batch(vcd_files, input_signals, args.output_pattern, args.jobs, args.summary,
+                                    args.format, parse_options, profile=bool(args.profile))
+            if args.profile:
+                with open(args.profile, 'w') as f:
+                    json.dump({'files': [record['profile'] for record in summary]}, f, indent=1)
+            failed = sum(1 for record in summary if record['status'] != 'ok')
+            print(f"Converted {len(summary) - failed}/{len(summary)} VCD files")
+            if failed:
+                sys.exit(1)
+            return
         
-        # 导出到CSV文件
-        export_to_csv(cycle_data, sorted_times, input_signals, args.output)
+        profiler = profiling.Profiler(enabled=bool(args.profile))
+        if args.follow:
+            follow = Verilog_VCD.Follow(args.follow_timeout, args.follow_pid)
+            follow_vcd(args.vcd, input_signals, args.output, args.format, follow, args.clock, args.edge, profiler)
+            timescale, endtime = Verilog_VCD.get_timescale(), Verilog_VCD.get_endtime()
+        else:
+            timescale, endtime = convert_vcd(args.vcd, input_signals, args.output, args.format, profiler,
+                                             **parse_options)
+        if args.profile:
+            profiler.write(args.profile, vcd=args.vcd, output=args.output, format=args.format)
         
         print(f"Timescale: {timescale}")
         print(f"End time: {endtime}")
         print(f"Results have been exported to {args.output}")
         
     except Exception as e:
-        print(f"Error: {str(e)}", file=sys.stderr)
+        # VCDParseError 的消息已带有 Error: 前缀
+        message = str(e)
+        print(message if message.startswith('Error:') else f"Error: {message}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == "__main__":
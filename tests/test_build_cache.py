@@ -0,0 +1,56 @@
+"""编译缓存的测试：缓存键和按最近使用时间淘汰"""
+import os
+
+import pytest
+
+pytest.importorskip('cocotb_test')
+
+import main
+
+
+def _entry(cache_dir, name, size, last_used):
+    """建立一个缓存目录：size 字节的模型文件，最近使用时间为 last_used"""
+    path = cache_dir / name
+    path.mkdir(parents=True)
+    (path / 'top').write_bytes(b'\0' * size)
+    stamp = path / main.LAST_USED
+    stamp.write_text(str(last_used))
+    os.utime(stamp, (last_used, last_used))
+    return path
+
+
+def test_evict_least_recently_used_but_keep_current(tmp_path):
+    """超出上限时从最久未使用的开始淘汰，正在使用的目录即使最旧也保留"""
+    oldest = _entry(tmp_path, 'top-a', 1000, 1000)
+    older = _entry(tmp_path, 'top-b', 1000, 2000)
+    old = _entry(tmp_path, 'top-c', 1000, 3000)
+    newest = _entry(tmp_path, 'top-d', 1000, 4000)
+    (tmp_path / 'notes.txt').write_text('not a cache entry')
+    main.evict_build_cache(str(tmp_path), 2100, keep=str(oldest))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['notes.txt', 'top-a', 'top-d']
+    assert not older.exists() and not old.exists() and newest.exists()
+
+
+def test_no_eviction_within_limit(tmp_path):
+    for i in range(3):
+        _entry(tmp_path, f'top-{i}', 1000, 1000 + i)
+    main.evict_build_cache(str(tmp_path), 3100, keep=str(tmp_path / 'top-0'))
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_cache_key_follows_sources_and_arguments(tmp_path, monkeypatch, capsys):
+    """RTL内容、顶层模块和编译参数相同时复用同一个目录，任一改变时使用新目录"""
+    monkeypatch.setattr(main, 'verilator_version', lambda: 'Verilator 5.020')
+    rtl = tmp_path / 'top.v'
+    rtl.write_text('module top; endmodule\n')
+    cache = str(tmp_path / 'cache')
+    first = main.cached_sim_build(cache, [str(rtl)], 'top', ['-O3'])
+    assert 'Build cache miss' in capsys.readouterr().out
+    (tmp_path / 'cache' / os.path.basename(first) / 'top').write_bytes(b'model')
+    assert main.cached_sim_build(cache, [str(rtl)], 'top', ['-O3']) == first
+    assert 'Build cache hit' in capsys.readouterr().out
+    assert os.path.exists(os.path.join(first, main.LAST_USED))
+
+    assert main.cached_sim_build(cache, [str(rtl)], 'top', ['-O2']) != first
+    rtl.write_text('module top; wire a; endmodule\n')
+    assert main.cached_sim_build(cache, [str(rtl)], 'top', ['-O3']) != first
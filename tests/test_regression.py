@@ -0,0 +1,88 @@
+"""回归脚本的测试：激励发现、每次重放的结果记录和汇总"""
+import argparse
+import json
+import os
+
+import regression
+
+# 代替 main.py：按 --id 写出命中/未命中的结果文件，或者失败退出
+FAKE_MAIN = '''import json, sys
+def arg(name):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else None
+test_id = arg('--id')
+if test_id == '1-3':
+    sys.exit(3)
+with open(arg('--result-file'), 'w') as f:
+    json.dump({'id': test_id, 'cover': '1' if test_id == '1-1' else '0'}, f)
+if arg('--profile'):
+    with open(arg('--profile'), 'w') as f:
+        json.dump({'stages': {'simulate': {'wall_seconds': 1.5, 'cpu_seconds': 1.0, 'calls': 1,
+                                           'counts': {'cycles': 10}}},
+                   'replay': {'stages': {'drive': {'wall_seconds': 0.5, 'cpu_seconds': 0.5, 'calls': 10,
+                                                   'counts': {'vpi_writes': 4}}}}}, f)
+'''
+
+
+def _stimulus(design_dir, test_id, name=None):
+    csv_dir = design_dir / test_id / 'csv'
+    csv_dir.mkdir(parents=True)
+    path = csv_dir / (name or f'Input_{test_id}.csv')
+    path.write_text('Time,a\n0,1\n')
+    return str(path)
+
+
+def test_discover_stimuli_in_numeric_order(tmp_path):
+    """只收集 <id>/csv/Input_<id>.csv，按 (id1, id2) 数字顺序排列"""
+    paths = {test_id: _stimulus(tmp_path, test_id) for test_id in ('1-168', '1-43', '2-5', '10-1')}
+    _stimulus(tmp_path, '1-7', 'Input_1-8.csv')
+    _stimulus(tmp_path, 'notes', 'Input_notes.csv')
+    assert regression.discover_stimuli(str(tmp_path)) == [
+        (test_id, paths[test_id]) for test_id in ('1-43', '1-168', '2-5', '10-1')]
+
+
+def _args(tmp_path, profile):
+    return argparse.Namespace(top='top', clock='clock', rtl='top.v', build_cache='cache', verbosity=0,
+                              work_root=str(tmp_path / 'work'), profile=profile)
+
+
+def test_run_one_records_and_summary(tmp_path, monkeypatch, capsys):
+    """每次重放在独立的 work_dir 中运行，结果汇总为命中/未命中/失败"""
+    fake_main = tmp_path / 'main.py'
+    fake_main.write_text(FAKE_MAIN)
+    monkeypatch.setattr(regression, 'MAIN', str(fake_main))
+    args = _args(tmp_path, profile=True)
+    records = [regression.run_one(args, test_id, 'stim.csv') for test_id in ('1-1', '1-2', '1-3')]
+
+    assert [(r['id'], r['cover'], r['status']) for r in records] == [
+        ('1-1', 'hit', 'ok'), ('1-2', 'miss', 'ok'), ('1-3', '', 'failed (3)')]
+    for r in records:
+        assert os.path.dirname(r['log']) == os.path.join(args.work_root, r['id'])
+    assert os.path.exists(os.path.join(args.work_root, '1-1', 'result.json'))
+    assert records[2]['profile'] is None
+
+    regression.print_table(records)
+    out = capsys.readouterr().out
+    assert out.splitlines()[-1] == '[RESULT] 1/3 coverage points hit, 1 failed'
+
+    profile = str(tmp_path / 'profile.json')
+    regression.write_profile(profile, records)
+    with open(profile) as f:
+        merged = json.load(f)
+    assert [run['id'] for run in merged['runs']] == ['1-1', '1-2', '1-3']
+    simulate = merged['total']['stages']['simulate']
+    assert (simulate['wall_seconds'], simulate['calls'], simulate['counts']) == (3.0, 2, {'cycles': 20})
+    assert merged['total']['replay']['drive']['counts'] == {'vpi_writes': 8}
+
+
+def test_stale_result_is_not_reused(tmp_path, monkeypatch):
+    """上一次回归留下的结果文件不能当作本次失败重放的结果"""
+    fake_main = tmp_path / 'main.py'
+    fake_main.write_text(FAKE_MAIN)
+    monkeypatch.setattr(regression, 'MAIN', str(fake_main))
+    args = _args(tmp_path, profile=False)
+    os.makedirs(os.path.join(args.work_root, '1-3'))
+    with open(os.path.join(args.work_root, '1-3', 'result.json'), 'w') as f:
+        json.dump({'cover': '1'}, f)
+    record = regression.run_one(args, '1-3', 'stim.csv')
+    assert (record['cover'], record['status']) == ('', 'failed (3)')
+    assert 'profile' not in record
@@ -0,0 +1,232 @@
+"""test_stimuli 中重放逻辑的测试：用假的DUT句柄代替仿真器，仿真时间推进不等待"""
+import logging
+
+import pytest
+
+cocotb = pytest.importorskip('cocotb')
+pytest.importorskip('debugpy')
+
+import test_stimuli
+from replaydata import SignalComparator
+
+
+class Handle:
+    """假的信号句柄，保存写入的值"""
+    def __init__(self, name, width=1, value=0):
+        self._name = name
+        self.width = width
+        self.value = value
+
+    def __len__(self):
+        return self.width
+
+
+class FakeDut:
+    def __init__(self, **widths):
+        for name, width in widths.items():
+            setattr(self, name, Handle(name, width))
+
+    def __iter__(self):
+        return (handle for handle in vars(self).values() if isinstance(handle, Handle))
+
+
+@pytest.fixture(autouse=True)
+def no_simulator(monkeypatch):
+    """仿真器之外运行：日志写到 logging，Timer 立即返回"""
+    class Timer:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __await__(self):
+            return iter(())
+    monkeypatch.setattr(cocotb, 'log', logging.getLogger('cocotb'), raising=False)
+    monkeypatch.setattr(test_stimuli, 'Timer', Timer)
+
+
+def _write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+COMPARE_CSV = '''Time,clock,q[1:0],r[1:0],missing
+0,0,01,00,0
+5,1,01,10,0
+10,0,10,10,0
+15,1,10,11,0
+'''
+
+
+def test_compare_plan_classifies_and_reports(tmp_path):
+    """启动时按 reglist 分为寄存器和线网，跳过时钟和DUT中不存在的信号；
+    前后都不匹配记为 mismatch，只有一侧不匹配记为 warning"""
+    comparator = SignalComparator(_write(tmp_path / 'cmp.csv', COMPARE_CSV))
+    dut = FakeDut(clock=1, q=2, r=2)
+    reporter = test_stimuli.ReplayReporter(verbosity=0)
+    plan = test_stimuli.ComparePlan(dut, comparator, ['re:^r$'], 'clock', reporter)
+    assert [entry.name for entry in plan.regs] == ['r']
+    assert [entry.name for entry in plan.wires] == ['q']
+    assert plan.regs[0].expected == {0: 0, 5: 2, 10: 2, 15: 3}
+
+    # 时间 0：r 与当前期望值相同、与 time+5 不同；q 前后都匹配
+    dut.q.value, dut.r.value = 1, 0
+    plan.check_before_posedge(0, 0)
+    plan.check_after_posedge(0, 0)
+    # 时间 10：r 与 time+5 的期望值相同；q 前后都不匹配
+    dut.q.value, dut.r.value = 0, 3
+    plan.check_before_posedge(1, 10)
+    plan.check_after_posedge(1, 10)
+
+    assert [(r['time'], r['signal'], r['status']) for r in reporter.records] == [
+        (0, 'r', 'warning'), (10, 'r', 'warning'), (10, 'q', 'mismatch')]
+    assert reporter.records[0]['expected_after'] == '10'
+    assert reporter.records[0]['got_after'] == '00'
+    assert reporter.records[2]['got_before'] == '00'
+    assert plan.reads == 6
+
+
+class Clock(Handle):
+    """时钟句柄：写入 1 时调用 DUT 的 posedge"""
+    def __init__(self, dut):
+        self.dut = dut
+        self._value = 0
+        super().__init__('clock')
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        rising = value == 1 and self._value == 0
+        self._value = value
+        if rising:
+            self.dut.posedge()
+
+
+class CounterDut(FakeDut):
+    """上升沿时 q 锁存 a，coverage0 置位 a 对应的位，a 为 3 时置位 coverage1[0]；
+    reset 只清零 q，覆盖向量保持"""
+    def __init__(self):
+        super().__init__(reset=1, a=2, q=2, coverage0=4, coverage1=3)
+        self.clock = Clock(self)
+        self.posedges = 0
+
+    def posedge(self):
+        self.posedges += 1
+        if self.reset.value:
+            self.q.value = 0
+            return
+        self.q.value = self.a.value
+        self.coverage0.value |= 1 << self.a.value
+        if self.a.value == 3:
+            self.coverage1.value |= 1
+
+
+def _run(coro):
+    """运行重放协程（Timer 已替换为立即返回）"""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise AssertionError('replay waited for a real trigger')
+
+
+def _stimulus(tmp_path, name, values):
+    rows = ''.join(f'{10 * i},{value:02b}\n' for i, value in enumerate(values))
+    return _write(tmp_path / name, 'Time,a[1:0]\n' + rows)
+
+
+def _replay(dut, csv_file, test_id, **kwargs):
+    reporter = test_stimuli.ReplayReporter(verbosity=0)
+    return _run(test_stimuli.replay_stimulus(dut, csv_file, test_id, 'clock', reporter, **kwargs))
+
+
+def test_back_to_back_stimuli_with_reset(tmp_path):
+    """同一次仿真中依次重放两个激励：中间复位，每个激励有各自的覆盖结果，
+    第一个激励已经置位的位在第二个激励中记为 cover_before/already_set"""
+    dut = CounterDut()
+    first = _replay(dut, _stimulus(tmp_path, 'one.csv', [0, 1]), '0-1', coverage_mode='final')
+    assert (first['cover_before'], first['cover']) == ('0', '1')
+    assert first['coverage']['hits'] == {'coverage0': [0, 1], 'coverage1': []}
+
+    _run(test_stimuli.reset_dut(dut, 'clock', 'reset', 2))
+    assert (dut.reset.value, dut.q.value) == (0, 0)
+
+    second = _replay(dut, _stimulus(tmp_path, 'two.csv', [1, 2]), '0-1', coverage_mode='final')
+    assert second['csv'].endswith('two.csv')
+    assert (second['cover_before'], second['cover']) == ('1', '1')
+    assert second['coverage']['hits'] == {'coverage0': [2], 'coverage1': []}
+    assert second['coverage']['already_set'] == {'coverage0': [0, 1], 'coverage1': []}
+
+
+def test_reset_skipped_without_reset_port(tmp_path):
+    dut = CounterDut()
+    del dut.reset
+    _run(test_stimuli.reset_dut(dut, 'clock', 'reset', 2))
+    assert dut.posedges == 0
+
+
+def test_coverage_monitor_samples_every_cycle(tmp_path):
+    """按实际位宽读取全部 coverage* 向量，记录每个新命中位首次置位的周期"""
+    dut = CounterDut()
+    dut.coverage0.value = 0b0100
+    result = _replay(dut, _stimulus(tmp_path, 'stim.csv', [0, 3, 3, 1]), '0-1', coverage_mode='cycle')
+    coverage = result['coverage']
+    assert coverage['widths'] == {'coverage0': 4, 'coverage1': 3}
+    assert coverage['hits'] == {'coverage0': [0, 1, 3], 'coverage1': [0]}
+    assert coverage['already_set'] == {'coverage0': [2], 'coverage1': []}
+    assert coverage['first_hit'] == {
+        '0-0': {'cycle': 0, 'time': 0},
+        '0-3': {'cycle': 1, 'time': 10},
+        '1-0': {'cycle': 1, 'time': 10},
+        '0-1': {'cycle': 3, 'time': 30},
+    }
+
+
+def test_coverage_monitor_final_mode_has_no_cycles(tmp_path):
+    """只在结束时读取时命中集合相同，首次置位周期未知"""
+    dut = CounterDut()
+    result = _replay(dut, _stimulus(tmp_path, 'stim.csv', [0, 3]), '0-1', coverage_mode='final')
+    assert result['coverage']['hits'] == {'coverage0': [0, 3], 'coverage1': [0]}
+    assert result['coverage']['first_hit'] == {'0-0': None, '0-3': None, '1-0': None}
+
+
+def test_read_cover_bit_by_integer_bit():
+    """覆盖位按整数取位，不依赖位宽；x/z 视为 0，向量不存在时为 None"""
+    dut = FakeDut(coverage3=4)
+    dut.coverage3.value = 'x1z0'
+    assert test_stimuli.read_cover_bit(dut, '3-2') == '1'
+    assert test_stimuli.read_cover_bit(dut, '3-3') == '0'
+    assert test_stimuli.read_cover_bit(dut, '3-1') == '0'
+    assert test_stimuli.read_cover_bit(dut, '4-0') is None
+
+
+EARLY = [0, 1, 2, 3, 0, 0, 0, 0]
+
+
+def test_early_exit_stops_when_target_fires(tmp_path):
+    """目标覆盖位在上升沿后置位即结束重放，不再推进剩余周期和结尾的两个周期"""
+    dut = CounterDut()
+    result = _replay(dut, _stimulus(tmp_path, 'stim.csv', EARLY), '0-2', early_exit=True)
+    assert result['fired'] == {'cycle': 2, 'time': 20}
+    assert (result['cycles'], result['cover']) == (8, '1')
+    assert dut.posedges == 3
+
+
+def test_without_early_exit_replays_everything(tmp_path):
+    dut = CounterDut()
+    result = _replay(dut, _stimulus(tmp_path, 'stim.csv', EARLY), '0-2')
+    assert 'fired' not in result
+    assert dut.posedges == len(EARLY) + 2
+
+
+@pytest.mark.parametrize('preset, target', [(0b0100, '0-2'), (0, '0-3'), (0, '5-0')])
+def test_early_exit_not_taken(tmp_path, preset, target):
+    """目标位重放前已置位、始终不置位或不存在时，完整重放且 fired 为 None"""
+    dut = CounterDut()
+    dut.coverage0.value = preset
+    values = [0, 1, 2, 0] if target == '0-3' else EARLY
+    result = _replay(dut, _stimulus(tmp_path, 'stim.csv', values), target, early_exit=True)
+    assert result['fired'] is None
+    assert result['cycles'] == len(values)
+    assert dut.posedges == len(values) + 2
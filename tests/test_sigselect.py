@@ -0,0 +1,36 @@
+"""sigselect 的回归测试"""
+import pytest
+
+import sigselect
+
+
+def test_regexes_with_inline_flags():
+    """带 (?i) 等全局标志的正则单独编译，不影响其他模式"""
+    selector = sigselect.compile_patterns(['re:(?i)io_.*_VALID', 're:^dbg_\\d+$', 'io_*_bits'])
+    assert selector.match('top', 'IO_a_valid')
+    assert selector.match('top', 'dbg_12')
+    assert not selector.match('top', 'DBG_12')
+    assert selector.match('top', 'io_a_bits')
+    assert not selector.match('top', 'IO_A_BITS')
+
+
+def test_regex_backreferences_are_not_renumbered():
+    """分组编号按各自的正则计算"""
+    selector = sigselect.compile_patterns(['re:(a)(b)', r're:(x)\1'])
+    assert selector.match('', 'xx')
+    assert not selector.match('', 'xa')
+
+
+def test_invalid_regex_names_the_pattern():
+    with pytest.raises(ValueError, match=r're:io_\(bad'):
+        sigselect.compile_patterns(['reset', 're:io_(bad'])
+
+
+def test_scopes_paths_and_wildcards():
+    selector = sigselect.compile_patterns(['reset', 'top.core.', 'top.io.a', 'top.*.b?', 'x*'])
+    assert selector.match('top.any', 'reset')
+    assert selector.match('top.core.alu', 'sum')
+    assert not selector.match('top.coreX', 'sum')
+    assert selector.match('top.io', 'a') and not selector.match('top.io', 'c')
+    assert selector.match('top.mem', 'b1') and not selector.match('top.mem', 'b12')
+    assert 'xyz' in selector and 'yx' not in selector
@@ -0,0 +1,53 @@
+"""稀疏激励CSV的读写测试"""
+import pytest
+
+import replaydata
+import sparsecsv
+
+STEPS = [
+    (0, [(0, '0'), (1, '0011')]),
+    (10, [(1, '1100')]),
+    (20, []),
+    (30, [(0, '1')]),
+]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'stim.sparse.csv')
+    assert sparsecsv.write_sparse(path, ['clk', 'a[3:0]'], iter(STEPS)) == 4
+    assert sparsecsv.is_sparse_csv(path)
+    signals, steps = sparsecsv.read_sparse(path)
+    assert signals == ['clk', 'a[3:0]']
+    assert list(steps) == STEPS
+
+
+def test_empty_selection_keeps_first_step(tmp_path):
+    """没有选中任何信号时第一个时间点也要写出"""
+    path = str(tmp_path / 'empty.sparse.csv')
+    assert sparsecsv.write_sparse(path, [], iter([(0, []), (10, []), (20, [])])) == 3
+    signals, steps = sparsecsv.read_sparse(path)
+    assert signals == []
+    assert list(steps) == [(0, []), (10, []), (20, [])]
+    assert replaydata.SignalReplay(path).timestamps == [0, 10, 20]
+
+
+def test_full_csv_with_sparse_like_header_is_not_sparse(tmp_path):
+    """信号恰好名为 Signal、Value 的完整CSV不能被误认为稀疏格式"""
+    path = tmp_path / 'full.csv'
+    path.write_text('Time,Signal,Value\n0,1,0\n10,0,1\n')
+    assert not sparsecsv.is_sparse_csv(str(path))
+    with pytest.raises(ValueError):
+        sparsecsv.read_sparse(str(path))
+    replay = replaydata.SignalReplay(str(path))
+    assert replay.timestamps == [0, 10]
+    assert replay.get_value_at_time('Value', 10) == '1'
+
+
+def test_signal_replay_carries_values_forward(tmp_path):
+    path = str(tmp_path / 'stim.sparse.csv')
+    sparsecsv.write_sparse(path, ['clk', 'a[3:0]'], iter(STEPS))
+    replay = replaydata.SignalReplay(path)
+    assert replay.timestamps == [0, 10, 20, 30]
+    assert replay.get_value_at_time('a', 20) == '1100'
+    assert replay.get_value_at_time('clk', 20) == '0'
+    assert replay.get_value_at_time('clk', 30) == '1'
@@ -0,0 +1,133 @@
+"""vcd2csv 的回归测试"""
+import csv
+import sys
+
+import pytest
+
+import Verilog_VCD
+import vcd2csv
+from gen_vcd import generate_vcd, signal_names
+
+CLOCKED_VCD = '''$timescale 1 ns $end
+$scope module top $end
+$var wire 1 ! clock $end
+$var wire 2 " a [1:0] $end
+$upscope $end
+$enddefinitions $end
+#0
+$dumpvars
+0!
+b00 "
+$end
+#5
+1!
+#10
+0!
+b01 "
+#15
+1!
+#20
+0!
+'''
+
+
+def _header(path):
+    with open(path, newline='') as f:
+        return next(csv.reader(f))
+
+
+def test_clock_column_selected_by_hierarchy(tmp_path):
+    """时钟由层次路径或作用域选中时作为一列输出，未选中时不输出"""
+    vcd_file = tmp_path / 'clk.vcd'
+    vcd_file.write_text(CLOCKED_VCD)
+    output = str(tmp_path / 'out.csv')
+    for patterns, expected in ((['top.clock', 'a[1:0]'], ['Time', 'a[1:0]', 'clock']),
+                               (['top.*'], ['Time', 'a[1:0]', 'clock']),
+                               (['a[1:0]'], ['Time', 'a[1:0]'])):
+        vcd2csv.convert_vcd(str(vcd_file), patterns, output, clock='clock')
+        assert _header(output) == expected
+
+
+NO_TIMESCALE_VCD = CLOCKED_VCD.replace('$timescale 1 ns $end\n', '')
+
+
+def test_follow_matches_convert_without_timescale(tmp_path):
+    """没有 $timescale 时边写边转换的输出与普通转换相同"""
+    vcd_file = tmp_path / 'nots.vcd'
+    vcd_file.write_text(NO_TIMESCALE_VCD)
+    converted = str(tmp_path / 'convert.csv')
+    followed = str(tmp_path / 'follow.csv')
+    vcd2csv.convert_vcd(str(vcd_file), ['top.*'], converted)
+    vcd2csv.follow_vcd(str(vcd_file), ['top.*'], followed, follow=Verilog_VCD.Follow(timeout=0.1, interval=0.01))
+    with open(converted) as a, open(followed) as b:
+        assert a.read() == b.read()
+
+
+@pytest.mark.parametrize('last', ['0', '-3'])
+def test_cli_rejects_last_below_one(tmp_path, monkeypatch, last):
+    """命令行的 --last 小于 1 时由 argparse 报错"""
+    vcd_file = tmp_path / 'clk.vcd'
+    vcd_file.write_text(CLOCKED_VCD)
+    inputs = tmp_path / 'inputs.list'
+    inputs.write_text('top.*\n')
+    monkeypatch.setattr(sys, 'argv', ['vcd2csv.py', '--vcd', str(vcd_file), '--inputs', str(inputs),
+                                      '--output', str(tmp_path / 'out.csv'), '--last', last])
+    with pytest.raises(SystemExit) as exc:
+        vcd2csv.main()
+    assert exc.value.code == 2
+    assert not (tmp_path / 'out.csv').exists()
+
+
+def test_cli_error_prefix_printed_once(tmp_path, monkeypatch, capsys):
+    """VCDParseError 的消息已带 Error: 前缀，不再重复"""
+    vcd_file = tmp_path / 'clk.vcd'
+    vcd_file.write_text(CLOCKED_VCD)
+    inputs = tmp_path / 'inputs.list'
+    inputs.write_text('top.*\n')
+
+    def fail(*args, **kwargs):
+        raise Verilog_VCD.VCDParseError("Error: broken VCD.")
+    monkeypatch.setattr(vcd2csv, 'convert_vcd', fail)
+    monkeypatch.setattr(sys, 'argv', ['vcd2csv.py', '--vcd', str(vcd_file), '--inputs', str(inputs),
+                                      '--output', str(tmp_path / 'out.csv')])
+    with pytest.raises(SystemExit):
+        vcd2csv.main()
+    assert capsys.readouterr().err == 'Error: broken VCD.\n'
+
+
+@pytest.mark.parametrize('output_format, ext', [('csv', 'csv'), ('bin', 'stim'), ('sparse', 'sparse.csv')])
+def test_batch_output_extension_follows_format(output_format, ext):
+    """默认输出模板的扩展名随 --format 变化"""
+    path = vcd2csv.batch_output_path('traces/run1.vcd.gz', '{dir}/{stem}.{ext}', output_format)
+    assert path == f'traces/run1.{ext}'
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'sparse'])
+@pytest.mark.parametrize('window', [{}, {'start': 2555, 'end': 4000}, {'last': 30}])
+def test_compact_storage_gives_the_same_output(tmp_path, output_format, window):
+    """紧凑存储（--compact）与默认存储的转换结果相同"""
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=20, width=4, cycles=600, density=0.2)
+    signals = signal_names(20, 4)
+    default = str(tmp_path / 'default.out')
+    compact = str(tmp_path / 'compact.out')
+    vcd2csv.convert_vcd(vcd_file, signals, default, output_format, **window)
+    vcd2csv.convert_vcd(vcd_file, signals, compact, output_format, compact=True, **window)
+    with open(default) as a, open(compact) as b:
+        assert a.read() == b.read()
+
+
+def test_cli_compact_flag(tmp_path, monkeypatch):
+    vcd_file = tmp_path / 'clk.vcd'
+    vcd_file.write_text(CLOCKED_VCD)
+    inputs = tmp_path / 'inputs.list'
+    inputs.write_text('top.*\n')
+    outputs = []
+    for extra in ([], ['--compact']):
+        output = str(tmp_path / f'out{len(outputs)}.csv')
+        monkeypatch.setattr(sys, 'argv', ['vcd2csv.py', '--vcd', str(vcd_file), '--inputs', str(inputs),
+                                          '--output', output] + extra)
+        vcd2csv.main()
+        with open(output) as f:
+            outputs.append(f.read())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,198 @@
+"""Verilog_VCD 的回归测试"""
+import gzip
+import io
+import os
+import shutil
+
+import pytest
+
+import Verilog_VCD
+from gen_vcd import generate_vcd
+
+
+def _window(vcd):
+    return {code: d['tv'] for code, d in vcd.items() if 'tv' in d}
+
+
+def test_window_start_just_before_checkpoint(tmp_path):
+    """start 落在检查点所在时间步之前的间隙时，窗口应包含 start 时刻的取值"""
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=8, cycles=600, density=0.25, period=10)
+    with open(vcd_file, 'rb') as src, gzip.open(vcd_file + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+    # 第 256 步（2560ns）有检查点，2555 在它之前的间隙里
+    indexed = _window(Verilog_VCD.parse_vcd(vcd_file, start=2555, end=2575))
+    streamed = _window(Verilog_VCD.parse_vcd(vcd_file + '.gz', start=2555, end=2575))
+    assert indexed == streamed
+    assert indexed and all(tv[0][0] == 2555 for tv in indexed.values())
+
+
+def test_zstd_multiple_frames(tmp_path):
+    """多帧（拼接而成）的 zstd 文件应完整读出，而不是只读第一帧"""
+    zstandard = pytest.importorskip('zstandard')
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=8, cycles=200, density=0.25)
+    with open(vcd_file, 'rb') as f:
+        data = f.read()
+    cut = data.index(b'\n#100\n') + 1
+    compressor = zstandard.ZstdCompressor()
+    with open(vcd_file + '.zst', 'wb') as f:
+        f.write(compressor.compress(data[:cut]))
+        f.write(compressor.compress(data[cut:]))
+
+    with Verilog_VCD.open_vcd(vcd_file + '.zst') as f:
+        assert f.read() == data
+    assert _window(Verilog_VCD.parse_vcd(vcd_file + '.zst')) == _window(Verilog_VCD.parse_vcd(vcd_file))
+
+
+NO_TIMESCALE_VCD = '''$scope module top $end
+$var wire 1 ! a $end
+$var wire 2 " b [1:0] $end
+$upscope $end
+$enddefinitions $end
+#0
+$dumpvars
+0!
+b00 "
+$end
+#5
+1!
+#10
+b10 "
+0!
+'''
+
+
+def test_stream_without_timescale_matches_parse(tmp_path):
+    """没有 $timescale 时流式读取与 parse_vcd 的时间相同"""
+    vcd_file = tmp_path / 'nots.vcd'
+    vcd_file.write_text(NO_TIMESCALE_VCD)
+    parsed = _window(Verilog_VCD.parse_vcd(str(vcd_file)))
+    streamed = {}
+    for time, changes in Verilog_VCD.iter_vcd_steps(str(vcd_file), parsed):
+        for code, value in changes:
+            streamed.setdefault(code, []).append((time, value))
+    assert streamed == parsed
+
+
+@pytest.mark.parametrize('last', [0, -3])
+def test_last_must_be_positive(tmp_path, last):
+    """last 小于 1 时报错，而不是越界或选错起点"""
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=4, cycles=50)
+    with pytest.raises(Verilog_VCD.VCDParseError):
+        Verilog_VCD.parse_vcd(vcd_file, last=last)
+
+
+def test_time_index_stores_only_changes(tmp_path):
+    """时间索引的检查点只保存变化的信号，不随 信号数 x 检查点数 增长，窗口结果不变"""
+    vcd_file = str(tmp_path / 'sparse.vcd')
+    generate_vcd(vcd_file, signals=1000, cycles=2000, density=0.001)
+    with open(vcd_file, 'rb') as src, gzip.open(vcd_file + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+    tindex = Verilog_VCD.build_time_index(vcd_file)
+    stored = sum(len(changed) for _, changed in tindex['checkpoints'])
+    assert len(tindex['checkpoints']) == 8
+    assert stored < 1000 + 7 * 256
+
+    for start in (0, 2555, 10000, 19985):
+        indexed = _window(Verilog_VCD.parse_vcd(vcd_file, start=start, end=start + 300))
+        streamed = _window(Verilog_VCD.parse_vcd(vcd_file + '.gz', start=start, end=start + 300))
+        assert indexed == streamed
+
+
+@pytest.mark.parametrize('window', [{'last': 1}, {'last': 40}, {'last': 40, 'end': 1850},
+                                    {'start': 1234, 'end': 1500}])
+def test_compressed_window_matches_indexed(tmp_path, window):
+    """压缩文件没有时间索引，完整流式解析后截取的窗口与索引定位的结果相同"""
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=8, cycles=200, density=0.25)
+    with open(vcd_file, 'rb') as src, gzip.open(vcd_file + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    indexed = _window(Verilog_VCD.parse_vcd(vcd_file, **window))
+    streamed = _window(Verilog_VCD.parse_vcd(vcd_file + '.gz', **window))
+    assert indexed and streamed == indexed
+
+
+BODY_VCD = '''$timescale 1 ns $end
+$scope module top $end
+$var wire 1 ! a $end
+$var wire 4 " bus [3:0] $end
+$var wire 1 # noise $end
+$upscope $end
+$enddefinitions $end
+#0
+0! b0000 "
+1#
+$comment
+  #99 1! b1111 "
+$end
+#3
+1!
+0#
+b1010
+"
+#7 0! x#'''
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 5, 64])
+def test_body_tokens_across_blocks(block_size):
+    """按块切分时，跨块的记号和末尾没有换行的记号都要完整产生"""
+    body = BODY_VCD.encode()
+    tokens = list(Verilog_VCD._iter_body_tokens(io.BytesIO(body), block_size))
+    assert tokens == body.split()
+
+
+def test_body_filters_unselected_and_comments(tmp_path):
+    """只保留选中的信号，$comment 内的内容被跳过，矢量的值与代码可以分在不同行"""
+    vcd_file = tmp_path / 'body.vcd'
+    vcd_file.write_text(BODY_VCD)
+    vcd = Verilog_VCD.parse_vcd(str(vcd_file), siglist=['top.a', 'top.bus[3:0]'])
+    assert sorted(vcd) == ['!', '"']
+    assert _window(vcd) == {
+        '!': [(0, '0'), (3, '1'), (7, '0')],
+        '"': [(0, '0000'), (3, '1010')],
+    }
+    assert Verilog_VCD.get_endtime() == 7
+
+
+def test_header_index_reused_and_invalidated(tmp_path, monkeypatch):
+    """头部索引按路径、大小、修改时间失效；有效时不再逐行解析头部"""
+    monkeypatch.setattr(Verilog_VCD, 'INDEX_DIR', '')
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=6, cycles=100, density=0.3)
+    expected = Verilog_VCD.parse_vcd(vcd_file)
+    sigs = Verilog_VCD.list_sigs(vcd_file)
+    assert Verilog_VCD.load_header_index(vcd_file) is None
+    assert Verilog_VCD.parse_vcd(vcd_file, use_index=1) == expected
+    index = Verilog_VCD.load_header_index(vcd_file)
+    assert index is not None and (tmp_path / 'g.vcd.idx').exists()
+    assert sorted(index['nets']) == sorted(expected)
+
+    def no_header_parse(*args, **kwargs):
+        raise AssertionError('header parsed again')
+    with monkeypatch.context() as m:
+        m.setattr(Verilog_VCD, 'open_vcd', no_header_parse)
+        assert Verilog_VCD.parse_vcd(vcd_file, use_index=1) == expected
+        assert Verilog_VCD.list_sigs(vcd_file, use_index=1) == sigs
+
+    st = os.stat(vcd_file)
+    os.utime(vcd_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert Verilog_VCD.load_header_index(vcd_file) is None
+    with open(vcd_file, 'a') as f:
+        f.write('#999999\n')
+    assert Verilog_VCD.load_header_index(vcd_file) is None
+
+
+def test_header_index_in_index_dir(tmp_path, monkeypatch):
+    """设置 INDEX_DIR 时索引写在该目录下，而不是VCD文件旁"""
+    index_dir = tmp_path / 'idx'
+    monkeypatch.setattr(Verilog_VCD, 'INDEX_DIR', str(index_dir))
+    vcd_file = str(tmp_path / 'g.vcd')
+    generate_vcd(vcd_file, signals=4, cycles=20)
+    Verilog_VCD.parse_vcd(vcd_file, use_index=1)
+    assert not (tmp_path / 'g.vcd.idx').exists()
+    assert [p.suffix for p in index_dir.iterdir()] == ['.idx']
+    assert Verilog_VCD.load_header_index(vcd_file) is not None